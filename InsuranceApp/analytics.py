@@ -0,0 +1,154 @@
+from datetime import date, timedelta
+from django.utils import timezone
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from typing import Any, Dict, Iterable, List, Tuple
+from redis.client import Pipeline
+
+from .cache import redis
+from .counters import DIRTY_VIEWS_KEY, view_counter
+from .models import Company, Response, Service, ServiceDailyStats, RollupCheckpoint
+
+# Redis hash of views counters by service, as they were at the last rollup
+ROLLED_VIEWS_KEY = "analytics/views"
+
+RESPONSES_CHECKPOINT = "responses"
+
+# Periods of analytics page, in days
+PERIODS = [7, 30, 90]
+
+# Row of daily stats: service, company, date, views and responses
+StatsRow = Tuple[int, int, date, int, int]
+
+
+def add_stats(rows: List[StatsRow]) -> None:
+    """Add views and responses to daily stats of services by one upsert statement"""
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(ServiceDailyStats._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (service_id, company_id, date, views, responses) VALUES {values} "
+            f"ON CONFLICT (service_id, date) DO UPDATE SET views = {table}.views + EXCLUDED.views, "
+            f"responses = {table}.responses + EXCLUDED.responses",
+            [value for row in rows for value in row]
+        )
+
+
+def rollup_responses() -> int:
+    """Aggregate responses, created after the checkpoint, into daily stats in batches of 'ANALYTICS_ROLLUP_BATCH'.
+    Keys are assigned before commit, so transactions commit out of key order. Only responses older than
+    'ANALYTICS_ROLLUP_LAG' seconds are aggregated, when every transaction with a lower key is committed too.
+    Checkpoint is locked and moved in the same transaction, so every response is counted once.
+    Return number of aggregated responses."""
+    total, settled = 0, timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_LAG)
+    while True:
+        with transaction.atomic():
+            RollupCheckpoint.objects.get_or_create(name=RESPONSES_CHECKPOINT)
+            checkpoint = RollupCheckpoint.objects.select_for_update().get(name=RESPONSES_CHECKPOINT)
+
+            # Checkpoint stops before the first unsettled response, so that gaps below it are filled later
+            unsettled = Response.objects.filter(id__gt=checkpoint.position, create_time__gt=settled) \
+                .order_by("id").values_list("id", flat=True).first()
+            responses = Response.objects.filter(id__gt=checkpoint.position)
+            if unsettled is not None:
+                responses = responses.filter(id__lt=unsettled)
+
+            keys = list(responses.order_by("id").values_list("id", flat=True)[:settings.ANALYTICS_ROLLUP_BATCH])
+            if not keys:
+                return total
+
+            counts = Response.objects.filter(id__gt=checkpoint.position, id__lte=keys[-1]) \
+                .values_list("service_id", "company_id", "response_date").annotate(count=Count("id")).order_by()
+            add_stats([(service, company, day, 0, count) for service, company, day, count in counts])
+
+            checkpoint.position = keys[-1]
+            checkpoint.save(update_fields=["position", "update_date"])
+
+        total += len(keys)
+
+
+def start_views(pipeline: Pipeline, service_ids: Iterable[int]) -> None:
+    """Add zero counters and rolled values of new services to 'pipeline', so that all of their views are rolled up"""
+    for service_id in service_ids:
+        pipeline.set(view_counter.key(service_id), 0, nx=True)
+        pipeline.hsetnx(ROLLED_VIEWS_KEY, service_id, 0)
+
+
+def rollup_views() -> int:
+    """Add views of services, counted since the last rollup, into stats of today. Only services, marked as dirty
+    by views counter, are read. Service without rolled value has views from before the rollup was introduced,
+    so its counter is taken as rolled value without adding its views. Return number of aggregated views."""
+    total, today = 0, date.today()
+    while True:
+        service_ids = [int(service_id) for service_id in redis.spop(DIRTY_VIEWS_KEY, settings.ANALYTICS_ROLLUP_BATCH)]
+        if not service_ids:
+            return total
+
+        try:
+            pipeline = redis.pipeline(transaction=False)
+            pipeline.mget([view_counter.key(service_id) for service_id in service_ids])
+            pipeline.hmget(ROLLED_VIEWS_KEY, service_ids)
+            counters, rolled = pipeline.execute()
+
+            counters = {service_id: int(counter or 0) for service_id, counter in zip(service_ids, counters)}
+            views: Dict[int, int] = dict()
+            for service_id, previous in zip(service_ids, rolled):
+                counter = counters[service_id]
+                if previous is None:
+                    views[service_id] = 0
+                    continue
+
+                # Counter below the rolled value was reset, so all of its views are new
+                previous = int(previous)
+                views[service_id] = counter - previous if counter >= previous else counter
+
+            owners = dict(Service.objects.filter(id__in=service_ids).values_list("id", "company_id"))
+            add_stats([(service_id, company, today, views[service_id], 0)
+                       for service_id, company in owners.items() if views[service_id]])
+        except Exception:
+            redis.sadd(DIRTY_VIEWS_KEY, *service_ids)
+            raise
+
+        # Rolled values of deleted services are dropped with them
+        pipeline = redis.pipeline(transaction=False)
+        if owners:
+            pipeline.hset(ROLLED_VIEWS_KEY, mapping={service_id: counters[service_id] for service_id in owners})
+        deleted = [service_id for service_id in service_ids if service_id not in owners]
+        if deleted:
+            pipeline.hdel(ROLLED_VIEWS_KEY, *deleted)
+        pipeline.execute()
+
+        total += sum(views[service_id] for service_id in owners)
+
+
+def get_company_analytics(company: Company, days: int) -> Dict[str, Any]:
+    """Return daily series and per service totals of views, responses and conversion of 'company'
+    for the last 'days' days, read from daily stats by one indexed query"""
+    today = date.today()
+    since = today - timedelta(days=days - 1)
+    rows = ServiceDailyStats.objects.filter(company=company, date__range=(since, today)) \
+        .values_list("service_id", "service__title", "date", "views", "responses")
+
+    series: Dict[date, List[int]] = {since + timedelta(days=day): [0, 0] for day in range(days)}
+    services: Dict[int, Dict[str, Any]] = defaultdict(lambda: {"views": 0, "responses": 0})
+    for service_id, title, day, views, responses in rows:
+        series[day][0] += views
+        series[day][1] += responses
+        services[service_id].update(id=service_id, title=title)
+        services[service_id]["views"] += views
+        services[service_id]["responses"] += responses
+
+    for stats in services.values():
+        stats["conversion"] = stats["responses"] / stats["views"] if stats["views"] else None
+
+    return {
+        "series": [(day, views, responses) for day, (views, responses) in sorted(series.items(), reverse=True)],
+        "services": sorted(services.values(), key=lambda stats: (-stats["responses"], -stats["views"])),
+        "views": sum(views for views, _ in series.values()),
+        "responses": sum(responses for _, responses in series.values())
+    }
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from elasticsearch_dsl.connections import connections
 
 
 class InsuranceappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "InsuranceApp"
+
+    def ready(self):
+        # Connect reference cache and cached users invalidation to model signals
+        from . import references, backends  # noqa: F401
+
+        # Time database queries and elasticsearch requests of every request
+        from .instrumentation import install_sql_wrapper, InstrumentedConnection
+        connection_created.connect(install_sql_wrapper)
+        connections.configure(
+            default={**settings.ELASTICSEARCH_DSL["default"], "connection_class": InstrumentedConnection}
+        )
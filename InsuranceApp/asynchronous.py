@@ -0,0 +1,178 @@
+import json
+import time
+import asyncio
+import logging
+
+from weakref import WeakKeyDictionary
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpRequest
+from elasticsearch import AsyncElasticsearch, ElasticsearchException
+from elasticsearch_dsl.response import Response as SearchResponse
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .cache import SEARCH_GENERATION_KEY, SEARCH_RECENCY_KEY, service_page_key, service_version_key, \
+    suggestions_key, similar_services_key, read_service_page
+from .counters import view_counter
+from .documents import ServiceDocument
+from .instrumentation import InstrumentedAsyncConnection, InstrumentedAsyncRedis
+from .services import MAX_RESULT_WINDOW, LISTING_FIELDS, ServiceSearchResult, search_by_services, decode_cursor, \
+    normalize_prefix, build_suggest_search, read_suggestions, build_similar_search, read_similar
+
+logger = logging.getLogger(__name__)
+
+
+class Clients(NamedTuple):
+    """Async clients of one event loop"""
+    elasticsearch: AsyncElasticsearch
+    redis: InstrumentedAsyncRedis
+
+
+# Connections of async clients belong to the event loop, which opened them
+_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, Clients]" = WeakKeyDictionary()
+
+
+def get_clients() -> Clients:
+    """Return async elasticsearch and redis clients of the running event loop, created on first use"""
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = Clients(
+            elasticsearch=AsyncElasticsearch(
+                connection_class=InstrumentedAsyncConnection, **settings.ELASTICSEARCH_DSL["default"]
+            ),
+            redis=InstrumentedAsyncRedis(host=settings.REDIS_HOST, port=int(settings.REDIS_PORT), db=0)
+        )
+
+    return _clients[loop]
+
+
+async def get_search_page(key: str) -> Dict[str, Any]:
+    """Async version of 'cache.get_search_page'"""
+    pipeline = get_clients().redis.pipeline(transaction=False)
+    pipeline.get(SEARCH_GENERATION_KEY)
+    pipeline.get(key)
+    pipeline.zadd(SEARCH_RECENCY_KEY, {key: time.time()}, xx=True)
+    generation, page, _ = await pipeline.execute()
+
+    generation = int(generation or 0)
+    if page is not None:
+        payload = json.loads(page)
+        if payload["generation"] == generation:
+            return payload
+
+    return {"generation": generation}
+
+
+async def set_search_page(key: str, payload: Dict[str, Any]) -> None:
+    """Async version of 'cache.set_search_page'"""
+    redis = get_clients().redis
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.set(key, json.dumps(payload), ex=settings.SEARCH_CACHE_TIMEOUT)
+    pipeline.zadd(SEARCH_RECENCY_KEY, {key: time.time()})
+    pipeline.zcard(SEARCH_RECENCY_KEY)
+    size: int = (await pipeline.execute())[-1]
+
+    if size > settings.SEARCH_CACHE_SIZE:
+        evicted = await redis.zpopmin(SEARCH_RECENCY_KEY, size - settings.SEARCH_CACHE_SIZE)
+        await redis.delete(*[member for member, _ in evicted])
+
+
+async def fetch_search_page(result: ServiceSearchResult) -> Dict[str, Any]:
+    """Fetch hits of the requested page and facet aggregations by two concurrent elasticsearch requests,
+    and merge them into one response body"""
+    start, stop = result.window
+    search = result.search.source(LISTING_FIELDS if result.listing else False).extra(track_total_hits=True)
+
+    if stop <= MAX_RESULT_WINDOW:
+        hits = search[start:stop].extra(aggs={})
+    else:
+        hits = search[0:stop - start].extra(aggs={}, search_after=decode_cursor(result.cursor)[1])
+
+    client = get_clients().elasticsearch
+    index = ServiceDocument._index._name
+    body, facets = await asyncio.gather(
+        client.search(index=index, body=hits.to_dict()),
+        client.search(index=index, body=search[0:0].source(False).extra(track_total_hits=False).to_dict())
+    )
+    result.calls["elasticsearch"] += 2
+
+    body["aggregations"] = facets.get("aggregations", {})
+    return body
+
+
+async def search_services(request: HttpRequest, per_page: int) -> ServiceSearchResult:
+    """Async version of 'search_by_services' for listing of the requested page. Cached page is read from redis,
+    missed page is fetched from elasticsearch concurrently with its facets. Pages deeper than
+    'MAX_RESULT_WINDOW' without matching cursor are walked by the synchronous search in a thread."""
+    result: ServiceSearchResult = search_by_services(request, per_page=per_page, listing=True)
+    start, stop = result.window
+
+    cursor = decode_cursor(result.cursor)
+    if stop > MAX_RESULT_WINDOW and (cursor is None or cursor[0] != start):
+        await sync_to_async(result._execute)(start, stop)
+        return result
+
+    result.calls["cache"] += 1
+    payload = await get_search_page(result.cache_key)
+    if "response" not in payload:
+        payload["response"] = await fetch_search_page(result)
+        await set_search_page(result.cache_key, payload)
+        result.calls["cache"] += 1
+
+    result._window = result.window
+    result._response = SearchResponse(result.search, payload["response"])
+    return result
+
+
+async def suggest_services(prefix: Optional[str]) -> List[str]:
+    """Async version of 'services.suggest_services'"""
+    prefix = normalize_prefix(prefix)
+    if not prefix:
+        return list()
+
+    redis = get_clients().redis
+    suggestions: Optional[bytes] = await redis.get(suggestions_key(prefix))
+    if suggestions is not None:
+        return json.loads(suggestions)
+
+    body = await get_clients().elasticsearch.search(
+        index=ServiceDocument._index._name, body=build_suggest_search(prefix).to_dict()
+    )
+    result = read_suggestions(body)
+    await redis.set(suggestions_key(prefix), json.dumps(result), ex=settings.SUGGEST_CACHE_TIMEOUT)
+    return result
+
+
+async def get_service_page(service_id: int) -> Dict[str, Any]:
+    """Async version of 'cache.get_service_page'"""
+    pipeline = get_clients().redis.pipeline(transaction=False)
+    pipeline.get(service_version_key(service_id))
+    pipeline.get(service_page_key(service_id))
+    pipeline.get(similar_services_key(service_id))
+    return read_service_page(*await pipeline.execute())
+
+
+async def get_similar_services(detail: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Async version of 'services.get_similar_services'"""
+    if "similar" in detail:
+        return detail["similar"]
+
+    clients = get_clients()
+    try:
+        body = await clients.elasticsearch.search(
+            index=ServiceDocument._index._name, body=build_similar_search(detail).to_dict()
+        )
+    except ElasticsearchException:
+        logger.exception("Failed to search similar services of service %s", detail["id"])
+        return list()
+
+    similar = read_similar(body)
+    await clients.redis.set(similar_services_key(detail["id"]), json.dumps(similar),
+                            ex=settings.SIMILAR_CACHE_TIMEOUT)
+    return similar
+
+
+async def get_views(service_id: int) -> int:
+    """Async version of 'view_counter.get'"""
+    views: Optional[bytes] = await get_clients().redis.get(view_counter.key(service_id))
+    return int(views or 0) + view_counter.pending(service_id)
@@ -0,0 +1,54 @@
+import pickle
+import logging
+
+from typing import Optional
+from django.conf import settings
+from redis.exceptions import RedisError
+from django.db import transaction
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.signals import post_save, post_delete
+
+from .cache import redis
+from .models import Company
+
+logger = logging.getLogger(__name__)
+
+
+def user_key(user_id) -> str:
+    """Return redis key of cached 'Company' row"""
+    return f"companies/{user_id}"
+
+
+class CachedModelBackend(ModelBackend):
+    """Authentication backend, that keeps 'Company' of logged in user in redis for 'AUTH_USER_CACHE_TIMEOUT'
+    seconds, so that authenticated requests do not query the user. Cache is dropped on every save of company."""
+
+    def get_user(self, user_id) -> Optional[Company]:
+        try:
+            cached: Optional[bytes] = redis.get(user_key(user_id))
+        except RedisError:
+            logger.warning("User is read from database, because redis is unavailable", exc_info=True)
+            return super().get_user(user_id)
+
+        if cached is not None:
+            user: Company = pickle.loads(cached)
+            return user if self.user_can_authenticate(user) else None
+
+        user = super().get_user(user_id)
+        if user is not None:
+            try:
+                redis.set(user_key(user_id), pickle.dumps(user), ex=settings.AUTH_USER_CACHE_TIMEOUT)
+            except RedisError:
+                pass
+
+        return user
+
+
+def invalidate_user(sender, instance: Company, **kwargs) -> None:
+    """Signal receiver, that drops cached company after its change is committed"""
+    pk = instance.pk
+    transaction.on_commit(lambda: redis.delete(user_key(pk)))
+
+
+post_save.connect(invalidate_user, sender=Company)
+post_delete.connect(invalidate_user, sender=Company)
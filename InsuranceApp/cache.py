@@ -0,0 +1,141 @@
+import json
+import time
+
+from django.conf import settings
+from typing import Any, Dict, Iterable, List, Optional
+
+from .instrumentation import InstrumentedRedis
+
+redis = InstrumentedRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
+
+SEARCH_GENERATION_KEY = "search/generation"
+SEARCH_RECENCY_KEY = "search/recency"
+
+
+def bump_search_generation() -> None:
+    """Invalidate all cached search pages, by moving search index to the next generation"""
+    redis.incr(SEARCH_GENERATION_KEY)
+
+
+def get_search_page(key: str) -> Dict[str, Any]:
+    """Return cached search page of the current generation by 'key' in one round trip.
+    Return empty payload, which still carries the current generation, if page is missing or stale."""
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.get(SEARCH_GENERATION_KEY)
+    pipeline.get(key)
+    pipeline.zadd(SEARCH_RECENCY_KEY, {key: time.time()}, xx=True)
+    generation, page, _ = pipeline.execute()
+
+    generation = int(generation or 0)
+    if page is not None:
+        payload = json.loads(page)
+        if payload["generation"] == generation:
+            return payload
+
+    return {"generation": generation}
+
+
+def set_search_page(key: str, payload: Dict[str, Any]) -> None:
+    """Cache search page by 'key' for 'SEARCH_CACHE_TIMEOUT' seconds,
+    evicting least recently used pages above 'SEARCH_CACHE_SIZE'"""
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.set(key, json.dumps(payload), ex=settings.SEARCH_CACHE_TIMEOUT)
+    pipeline.zadd(SEARCH_RECENCY_KEY, {key: time.time()})
+    pipeline.zcard(SEARCH_RECENCY_KEY)
+    size: int = pipeline.execute()[-1]
+
+    if size > settings.SEARCH_CACHE_SIZE:
+        evicted = [member for member, _ in redis.zpopmin(SEARCH_RECENCY_KEY, size - settings.SEARCH_CACHE_SIZE)]
+        redis.delete(*evicted)
+
+
+def suggestions_key(prefix: str) -> str:
+    """Return redis key of autocomplete suggestions for normalized prefix"""
+    return f"search/suggestions/{prefix}"
+
+
+def get_suggestions(prefix: str) -> Optional[List[str]]:
+    """Return cached autocomplete suggestions for prefix, or None if they are missing"""
+    suggestions = redis.get(suggestions_key(prefix))
+    return json.loads(suggestions) if suggestions is not None else None
+
+
+def set_suggestions(prefix: str, suggestions: List[str]) -> None:
+    """Cache autocomplete suggestions for prefix for 'SUGGEST_CACHE_TIMEOUT' seconds. Changes of services are
+    not tracked, because suggestions expire soon enough."""
+    redis.set(suggestions_key(prefix), json.dumps(suggestions), ex=settings.SUGGEST_CACHE_TIMEOUT)
+
+
+def service_page_key(service_id: int) -> str:
+    """Return redis key of rendered service fragment"""
+    return f"pages/services/{service_id}"
+
+
+def service_version_key(service_id: int) -> str:
+    """Return redis key of version of service fragment, bumped by every change of service or its company"""
+    return f"pages/services/{service_id}/version"
+
+
+def similar_services_key(service_id: int) -> str:
+    """Return redis key of similar services of service"""
+    return f"pages/services/{service_id}/similar"
+
+
+def get_service_page(service_id: int) -> Dict[str, Any]:
+    """Return rendered service fragment of the current version with its similar services in one round trip.
+    Return empty payload, which still carries the current version, if fragment is missing or stale.
+    Cached similar services are returned under 'similar' key either way."""
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.get(service_version_key(service_id))
+    pipeline.get(service_page_key(service_id))
+    pipeline.get(similar_services_key(service_id))
+    version, page, similar = pipeline.execute()
+
+    return read_service_page(version, page, similar)
+
+
+def read_service_page(version: Optional[bytes], page: Optional[bytes], similar: Optional[bytes]) -> Dict[str, Any]:
+    """Return payload of 'get_service_page' from raw redis values"""
+    version = int(version or 0)
+    payload = {"version": version}
+    if page is not None:
+        cached = json.loads(page)
+        if cached["version"] == version:
+            payload = cached
+
+    if similar is not None:
+        payload["similar"] = json.loads(similar)
+
+    return payload
+
+
+def set_service_page(service_id: int, payload: Dict[str, Any]) -> None:
+    """Cache rendered service fragment for 'SERVICE_PAGE_TIMEOUT' seconds. Similar services are cached apart."""
+    fragment = {key: value for key, value in payload.items() if key != "similar"}
+    redis.set(service_page_key(service_id), json.dumps(fragment), ex=settings.SERVICE_PAGE_TIMEOUT)
+
+
+def set_similar_services(service_id: int, similar: List[Dict[str, Any]]) -> None:
+    """Cache similar services of service for 'SIMILAR_CACHE_TIMEOUT' seconds"""
+    redis.set(similar_services_key(service_id), json.dumps(similar), ex=settings.SIMILAR_CACHE_TIMEOUT)
+
+
+def delete_similar_services(service_ids: Iterable[int], batch: int = 1000) -> None:
+    """Invalidate cached similar services of services, deleting keys in batches"""
+    keys: List[str] = list()
+    for service_id in service_ids:
+        keys.append(similar_services_key(service_id))
+        if len(keys) == batch:
+            redis.delete(*keys)
+            keys = list()
+
+    if keys:
+        redis.delete(*keys)
+
+
+def bump_service_pages(service_ids: Iterable[int]) -> None:
+    """Invalidate cached fragments of services, by moving them to the next version"""
+    pipeline = redis.pipeline(transaction=False)
+    for service_id in service_ids:
+        pipeline.incr(service_version_key(service_id))
+    pipeline.execute()
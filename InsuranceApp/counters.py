@@ -0,0 +1,99 @@
+import os
+import time
+import atexit
+import logging
+import threading
+
+from collections import Counter
+from django.conf import settings
+from typing import Dict, Iterable
+
+from .cache import redis
+
+logger = logging.getLogger(__name__)
+
+# Redis set of services, whose views changed since the last analytics rollup
+DIRTY_VIEWS_KEY = "analytics/dirty"
+
+
+class ViewCounter:
+    """Per-process buffer of service views, flushed into redis with pipelined INCRBY
+    every 'VIEW_COUNTER_INTERVAL' seconds or once 'VIEW_COUNTER_SIZE' views are buffered"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer: Counter = Counter()
+        self._pid = None
+
+    @staticmethod
+    def key(service_id: int) -> str:
+        """Return redis key of views counter of service"""
+        return f"services/{service_id}"
+
+    def incr(self, service_id: int) -> None:
+        """Count one view of service"""
+        with self._lock:
+            self._buffer[service_id] += 1
+            full = sum(self._buffer.values()) >= settings.VIEW_COUNTER_SIZE
+
+            # Flushing thread is started lazily, so that it also runs in processes forked after import
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="view-counter", daemon=True).start()
+
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered views into redis in one round trip. Views are buffered back on failure."""
+        with self._lock:
+            buffer, self._buffer = self._buffer, Counter()
+
+        if not buffer:
+            return
+
+        try:
+            pipeline = redis.pipeline(transaction=False)
+            for service_id, views in buffer.items():
+                pipeline.incrby(self.key(service_id), views)
+            pipeline.sadd(DIRTY_VIEWS_KEY, *buffer.keys())
+            pipeline.execute()
+        except Exception:
+            with self._lock:
+                self._buffer.update(buffer)
+            raise
+
+    def get_many(self, service_ids: Iterable[int]) -> Dict[int, int]:
+        """Return views of many services by one MGET, including views not flushed yet by this process"""
+        service_ids = list(service_ids)
+        if not service_ids:
+            return dict()
+
+        values = redis.mget([self.key(service_id) for service_id in service_ids])
+        with self._lock:
+            return {
+                service_id: int(value or 0) + self._buffer[service_id]
+                for service_id, value in zip(service_ids, values)
+            }
+
+    def pending(self, service_id: int) -> int:
+        """Return views of service, buffered by this process and not flushed yet"""
+        with self._lock:
+            return self._buffer[service_id]
+
+    def get(self, service_id: int) -> int:
+        """Return views of service"""
+        return self.get_many([service_id])[service_id]
+
+    def _run(self) -> None:
+        """Flush buffered views every 'VIEW_COUNTER_INTERVAL' seconds"""
+        while True:
+            time.sleep(settings.VIEW_COUNTER_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush service views")
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
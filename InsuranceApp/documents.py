@@ -1,13 +1,27 @@
 from .models import Service, InsuranceType, ValidityType, Company
+from .cache import bump_search_generation, delete_similar_services
 
+from django.db.models import Model, QuerySet
+from elasticsearch_dsl import normalizer
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 
+# Keyword normalizer for case and accent insensitive sorting
+sortable = normalizer("sortable", filter=["lowercase", "asciifolding"])
+
+# Length of year in seconds, which are units of 'ValidityType.time'
+SECONDS_PER_YEAR = 31536000
+
 
 @registry.register_document
 class ServiceDocument(Document):
     """Model-like class for persisting documents in elasticsearch"""
-    title = fields.TextField(fielddata=True)
+    id = fields.IntegerField()
+    title = fields.TextField(fields={"sort": fields.KeywordField(normalizer=sortable)})
+    price = fields.DoubleField()
+    coverage_amount = fields.DoubleField()
+    value = fields.DoubleField()
+    suggest = fields.CompletionField()
     type = fields.ObjectField(properties={
         "id": fields.IntegerField(),
         "name": fields.TextField(),
@@ -36,7 +50,7 @@ class ServiceDocument(Document):
     class Django:
         """Django model associated with this Document"""
         model = Service
-        fields = ["description", "coverage_amount", "price"]
+        fields = ["description"]
 
         # Service will be re-saved when InsuranceType, ValidityType or Company is updated
         related_models = [InsuranceType, ValidityType, Company]
@@ -45,6 +59,36 @@ class ServiceDocument(Document):
         """Return the queryset that should be indexed by this document"""
         return super(ServiceDocument, self).get_queryset().select_related("type", "validity", "company")
 
+    def prepare_value(self, instance):
+        """Return coverage per unit of price per year of validity, which ranks services by value for money.
+        Value is recomputed whenever service or its validity type is reindexed."""
+        if instance.price <= 0 or instance.validity.time <= 0:
+            return None
+
+        return instance.coverage_amount * (instance.validity.time / SECONDS_PER_YEAR) / instance.price
+
+    def prepare_suggest(self, instance):
+        """Return inputs of search-as-you-type suggestions: title, then company name, then type name and risks"""
+        return [
+            {"input": [instance.title], "weight": 3},
+            {"input": [instance.company.name], "weight": 2},
+            {"input": [instance.type.name, *instance.type.risks], "weight": 1}
+        ]
+
     def get_instances_from_related(self, related_instance):
         """Retrieve the Service instance(s) from the related models"""
         return related_instance.service_set.all()
+
+    def update(self, thing, refresh=None, action="index", parallel=False, **kwargs):
+        """Update each document in elasticsearch, then invalidate cached search pages and similar services"""
+        result = super(ServiceDocument, self).update(thing, refresh, action, parallel, **kwargs)
+        bump_search_generation()
+
+        if isinstance(thing, Model):
+            delete_similar_services([thing.pk])
+        elif isinstance(thing, QuerySet):
+            delete_similar_services(thing.values_list("pk", flat=True).iterator())
+        else:
+            delete_similar_services(instance.pk for instance in thing)
+
+        return result
@@ -0,0 +1,69 @@
+import csv
+import json
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.db.models import QuerySet
+from django.core.serializers.json import DjangoJSONEncoder
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .models import Response
+from .services import filter_company_responses, seek_rows, encode_values, parse_row_cursor
+
+# Exported columns of 'Response', in the order of CSV header. 'cursor' resumes export after the row.
+EXPORT_FIELDS = ["id", "full_name", "email", "phone", "birth_date", "response_date", "service_id", "service__title"]
+EXPORT_HEADER = [
+    "id", "full_name", "email", "phone", "birth_date", "response_date", "service", "service_title", "cursor"
+]
+
+# Export ordering, served by backward scan of the (company, response_date, id) index
+EXPORT_ORDERING: Tuple[str, str] = ("response_date", "id")
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson"
+}
+
+
+class Echo:
+    """Pseudo-buffer for 'csv.writer', that returns written line instead of keeping it"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def parse_export_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """Service for decoding cursor of exported row into values of 'EXPORT_ORDERING'. Return None if it is invalid."""
+    return parse_row_cursor(cursor, Response, EXPORT_ORDERING)
+
+
+def get_export_rows(request: HttpRequest, after: Optional[List[Any]]) -> Iterator[List[Any]]:
+    """Service for streaming filtered responses of the company of user through server-side cursor,
+    starting after the row with ordering values 'after'. Each row ends with the cursor of itself."""
+    responses: QuerySet = filter_company_responses(request).order_by(*EXPORT_ORDERING)
+
+    if after is not None:
+        responses = seek_rows(responses, EXPORT_ORDERING, after)
+
+    for row in responses.values_list(*EXPORT_FIELDS).iterator(chunk_size=settings.RESPONSE_EXPORT_CHUNK):
+        yield [*row, encode_values([row[5], row[0]])]
+
+
+def stream_csv(rows: Iterator[List[Any]]) -> Iterator[str]:
+    """Service for encoding rows as CSV lines, header first"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(rows: Iterator[List[Any]]) -> Iterator[str]:
+    """Service for encoding rows as JSON Lines"""
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_HEADER, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def export_responses(request: HttpRequest, export_format: str, after: Optional[List[Any]] = None) -> Iterator[str]:
+    """Service for lazy export of responses in 'export_format', which fetches rows only while it is consumed"""
+    rows = get_export_rows(request, after)
+    return stream_csv(rows) if export_format == "csv" else stream_jsonl(rows)
@@ -1,8 +1,10 @@
+from uuid import uuid4
 from django import forms
 from datetime import date
 from django.contrib.auth.forms import UserCreationForm
 
-from .models import Company, Service, Response, ValidityType, InsuranceType
+from .models import Company, Service, Response
+from .references import insurance_types, validity_types
 
 
 class RegisterForm(UserCreationForm):
@@ -46,8 +48,8 @@ class ServiceForm(forms.ModelForm):
     price = forms.FloatField()
     coverage_amount = forms.FloatField()
     description = forms.Textarea()
-    type = forms.ChoiceField(widget=forms.Select, choices=InsuranceType.objects.values_list("pk", "name"))
-    validity = forms.ChoiceField(widget=forms.Select, choices=ValidityType.objects.values_list("pk", "name"))
+    type = forms.ChoiceField(widget=forms.Select, choices=insurance_types.choices)
+    validity = forms.ChoiceField(widget=forms.Select, choices=validity_types.choices)
 
     class Meta:
         """Configuration class for auto-generated fields and form customizations"""
@@ -55,12 +57,12 @@ class ServiceForm(forms.ModelForm):
         fields = ("title", "description", "coverage_amount", "price", "type", "validity")
 
     def clean_type(self):
-        """Method for cleaning data from 'type' field. Return 'InsuranceType' object by primary key."""
-        return InsuranceType.objects.get(pk=self.cleaned_data["type"])
+        """Method for cleaning data from 'type' field. Return cached 'InsuranceType' object by primary key."""
+        return insurance_types.get(self.cleaned_data["type"])
 
     def clean_validity(self):
-        """Method for cleaning data from 'validity' field. Return 'ValidityType' object by primary key."""
-        return ValidityType.objects.get(pk=self.cleaned_data["validity"])
+        """Method for cleaning data from 'validity' field. Return cached 'ValidityType' object by primary key."""
+        return validity_types.get(self.cleaned_data["validity"])
 
 
 class ResponseForm(forms.ModelForm):
@@ -69,6 +71,7 @@ class ResponseForm(forms.ModelForm):
     email = forms.EmailField(widget=forms.EmailInput, max_length=200)
     phone = forms.CharField(max_length=12)
     birth_date = forms.DateField(initial=date.today())
+    key = forms.UUIDField(widget=forms.HiddenInput, initial=uuid4)
 
     class Meta:
         """Configuration class for auto-generated fields and form customizations"""
@@ -0,0 +1,120 @@
+import io
+import csv
+import json
+import time
+
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from typing import Any, Dict, IO, Iterator, List, Tuple
+
+from .analytics import start_views
+from .cache import redis, bump_service_pages
+from .forms import ServiceForm
+from .indexing import enqueue
+from .models import Company, Service
+
+IMPORT_FORMATS = ["csv", "json", "jsonl"]
+
+# Columns of 'Service', written by import. Rows with 'id' update existing services of the company.
+IMPORT_FIELDS = ["title", "description", "coverage_amount", "price", "type", "validity"]
+
+
+def get_import_format(filename: str) -> str:
+    """Service for detecting import format by file extension, falling back to CSV"""
+    extension = filename.rsplit(".", 1)[-1].lower()
+    return extension if extension in IMPORT_FORMATS else "csv"
+
+
+def read_rows(file: IO[bytes], import_format: str) -> Iterator[Dict[str, Any]]:
+    """Service for reading rows of uploaded file. CSV and JSON Lines are read lazily, JSON array at once."""
+    if import_format == "json":
+        yield from json.load(file)
+        return
+
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if import_format == "jsonl":
+        yield from (json.loads(line) for line in text if line.strip())
+    else:
+        yield from csv.DictReader(text)
+
+
+def validate(rows: List[Tuple[int, Dict[str, Any]]], company: Company,
+             errors: List[Dict[str, Any]]) -> Tuple[List[Service], List[Service]]:
+    """Service for validating batch of numbered rows with 'ServiceForm'. Existing services are loaded in one query.
+    Return new and updated services, appending errors of invalid rows to 'errors'."""
+    ids = [int(row["id"]) for _, row in rows if isinstance(row, dict) and str(row.get("id") or "").isdigit()]
+    existing = Service.objects.filter(company=company).in_bulk(ids)
+
+    created, updated = list(), list()
+    for number, row in rows:
+        if not isinstance(row, dict):
+            errors.append({"row": number, "errors": {"__all__": ["Row must be an object"]}})
+            continue
+
+        pk = str(row.get("id") or "")
+        instance = None
+        if pk:
+            instance = existing.get(int(pk)) if pk.isdigit() else None
+            if instance is None:
+                errors.append({"row": number, "errors": {"id": [f"Service {pk} of the company does not exist"]}})
+                continue
+
+        form = ServiceForm(data={field: row.get(field) for field in IMPORT_FIELDS}, instance=instance)
+        if not form.is_valid():
+            errors.append({"row": number, "errors": form.errors.get_json_data()})
+            continue
+
+        service: Service = form.save(commit=False)
+        service.company = company
+        (updated if instance else created).append(service)
+
+    return created, updated
+
+
+def import_services(company: Company, rows: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """Service for importing services of 'company' in batches of 'SERVICE_IMPORT_BATCH' rows.
+    Each batch is validated, written by 'bulk_create' and 'bulk_update' in one transaction,
+    gets views counters by one pipeline and is queued for indexing. Malformed file stops the import
+    after the rows read before it, which are still written.
+    Return numbers of created and updated services, errors of invalid rows, file error and import speed."""
+    started = time.monotonic()
+    report: Dict[str, Any] = {"rows": 0, "created": 0, "updated": 0, "errors": list(), "error": None}
+
+    numbered = enumerate(rows, start=1)
+    while report["error"] is None:
+        batch = list()
+        try:
+            for row in islice(numbered, settings.SERVICE_IMPORT_BATCH):
+                batch.append(row)
+        except (ValueError, csv.Error) as error:
+            report["error"] = f"Malformed file after row {report['rows'] + len(batch)}: {error}"
+
+        if not batch:
+            break
+
+        report["rows"] += len(batch)
+        created, updated = validate(batch, company, report["errors"])
+
+        with transaction.atomic():
+            Service.objects.bulk_create(created)
+            Service.objects.bulk_update(updated, IMPORT_FIELDS)
+
+        if updated:
+            bump_service_pages(service.pk for service in updated)
+
+        if created:
+            pipeline = redis.pipeline(transaction=False)
+            start_views(pipeline, [service.id for service in created])
+            pipeline.execute()
+
+        # Bulk writes send no model signals, so the batch is queued here instead of by the signal processor
+        if created or updated:
+            enqueue(f"{Service._meta.label}:{service.pk}" for service in created + updated)
+
+        report["created"] += len(created)
+        report["updated"] += len(updated)
+
+    report["seconds"] = round(time.monotonic() - started, 3)
+    report["rows_per_second"] = round(report["rows"] / report["seconds"], 1) if report["seconds"] else None
+    return report
@@ -0,0 +1,150 @@
+import time
+
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from typing import Dict, Iterable, List, Set
+
+from django_elasticsearch_dsl.apps import DEDConfig
+from django_elasticsearch_dsl.registries import registry
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+
+from .cache import redis
+
+# Sorted set of queued '<model label>:<pk>' members, scored by the time they were first queued
+INDEX_QUEUE_KEY = "index/queue"
+
+# Flag, which is set while flush of the queue is scheduled, so bursts of saves are flushed together
+INDEX_SCHEDULED_KEY = "index/scheduled"
+
+# Flag, which holds queued members back while the index is rebuilt. Expires, if rebuild never finishes.
+INDEX_PAUSED_KEY = "index/paused"
+INDEX_PAUSED_TIMEOUT = 24 * 60 * 60
+
+
+def enqueue(members: Iterable[str]) -> None:
+    """Queue '<model label>:<pk>' members for indexing and schedule debounced flush of the queue"""
+    now = time.time()
+    redis.zadd(INDEX_QUEUE_KEY, {member: now for member in members}, nx=True)
+    schedule_flush(settings.SEARCH_INDEX_DELAY)
+
+
+def schedule_flush(delay: int) -> None:
+    """Schedule flush of the queue in 'delay' seconds, unless it is already scheduled"""
+    if redis.set(INDEX_SCHEDULED_KEY, 1, nx=True, ex=delay + 60):
+        from .tasks import flush_search_index
+        flush_search_index.apply_async(countdown=delay)
+
+
+def get_queue_stats() -> Dict[str, float]:
+    """Return number of queued members and age in seconds of the oldest one"""
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.zcard(INDEX_QUEUE_KEY)
+    pipeline.zrange(INDEX_QUEUE_KEY, 0, 0, withscores=True)
+    depth, oldest = pipeline.execute()
+
+    return {"depth": depth, "lag": time.time() - oldest[0][1] if oldest else 0.0}
+
+
+def pause_queue() -> None:
+    """Hold queued members back from flushing"""
+    redis.set(INDEX_PAUSED_KEY, 1, ex=INDEX_PAUSED_TIMEOUT)
+
+
+def resume_queue() -> None:
+    """Allow queued members to be flushed, and schedule flush of members held back meanwhile"""
+    redis.delete(INDEX_PAUSED_KEY)
+    if redis.zcard(INDEX_QUEUE_KEY):
+        schedule_flush(settings.SEARCH_INDEX_DELAY)
+
+
+def flush_queue() -> int:
+    """Index queued members in bulk batches of 'SEARCH_INDEX_BATCH', until queue is empty.
+    Members of a failed batch are queued back and flushed again in 'SEARCH_INDEX_RETRY_DELAY' seconds.
+    Return number of flushed members."""
+    redis.delete(INDEX_SCHEDULED_KEY)
+    if redis.exists(INDEX_PAUSED_KEY):
+        return 0
+
+    flushed = 0
+    while True:
+        batch = redis.zpopmin(INDEX_QUEUE_KEY, settings.SEARCH_INDEX_BATCH)
+        if not batch:
+            return flushed
+
+        try:
+            index_members([member.decode() for member, _ in batch])
+        except Exception:
+            redis.zadd(INDEX_QUEUE_KEY, dict(batch), nx=True)
+            schedule_flush(settings.SEARCH_INDEX_RETRY_DELAY)
+            raise
+
+        flushed += len(batch)
+
+
+def index_members(members: List[str]) -> None:
+    """Index instances by '<model label>:<pk>' members. Instances of related models are expanded
+    into indexed instances, and instances missing from database are deleted from index."""
+    keys: Dict[str, Set[str]] = defaultdict(set)
+    for member in members:
+        label, pk = member.rsplit(":", 1)
+        keys[label].add(pk)
+
+    indexed: Dict[type, Set[str]] = defaultdict(set)
+    for label, pks in keys.items():
+        model = apps.get_model(label)
+        if model in registry.get_models():
+            indexed[model].update(pks)
+
+        for document in registry.get_documents():
+            if model in getattr(document.django, "related_models", []):
+                for instance in model.objects.filter(pk__in=pks):
+                    related = document().get_instances_from_related(instance)
+                    indexed[document.django.model].update(str(pk) for pk in related.values_list("pk", flat=True))
+
+    for model, pks in indexed.items():
+        for document in registry.get_documents([model]):
+            document = document()
+            instances = list(document.get_queryset().filter(pk__in=pks))
+            if instances:
+                document.update(instances)
+
+            missing = pks - {str(instance.pk) for instance in instances}
+            if missing:
+                document.update([model(pk=pk) for pk in missing], action="delete", raise_on_error=False)
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """Signal processor, which queues saved and deleted instances into redis after commit,
+    instead of indexing them and all their related instances inside the request"""
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def handle_save(self, sender, instance, **kwargs):
+        """Queue saved instance of indexed or related model"""
+        # Login saves only 'last_login' of company, which is not indexed
+        if kwargs.get("update_fields") == frozenset(["last_login"]):
+            return
+
+        if DEDConfig.autosync_enabled() and self.is_tracked(sender):
+            # Member is built eagerly, because deleted instance loses its primary key before commit
+            member = f"{instance._meta.label}:{instance.pk}"
+            transaction.on_commit(lambda: enqueue([member]))
+
+    def handle_delete(self, sender, instance, **kwargs):
+        """Queue deleted instance, which is removed from index by flush"""
+        self.handle_save(sender, instance, **kwargs)
+
+    @staticmethod
+    def is_tracked(model) -> bool:
+        """Return True if instances of 'model' are indexed or affect indexed documents"""
+        return model in registry.get_models() or any(
+            model in getattr(document.django, "related_models", []) for document in registry.get_documents()
+        )
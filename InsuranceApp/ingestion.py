@@ -0,0 +1,138 @@
+import json
+
+from uuid import UUID
+from datetime import date
+from django.conf import settings
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from redis.exceptions import ResponseError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import redis
+from .models import Response, Service
+
+RESPONSE_STREAM_KEY = "responses/stream"
+RESPONSE_GROUP = "ingestion"
+
+# Marks of responses, which companies were notified about. Outlive redelivery of unacknowledged entries.
+NOTIFIED_TIMEOUT = 24 * 60 * 60
+
+
+def notified_key(key: str) -> str:
+    """Return redis key of mark, which is set once company is notified about response with idempotency 'key'"""
+    return f"responses/notified/{key}"
+
+
+def submit(cleaned_data: Dict[str, Any], service: Service) -> None:
+    """Append validated response to the stream, which costs the request one redis write"""
+    record = {
+        "key": cleaned_data["key"].hex,
+        "full_name": cleaned_data["full_name"],
+        "email": cleaned_data["email"],
+        "phone": cleaned_data["phone"],
+        "birth_date": cleaned_data["birth_date"],
+        "response_date": date.today(),
+        "service": service.id,
+        "service_title": service.title,
+        "company": service.company.id,
+        "company_email": service.company.email
+    }
+    redis.xadd(RESPONSE_STREAM_KEY, {"record": json.dumps(record, cls=DjangoJSONEncoder)})
+
+
+def notification(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Return notification payload of ingested response record"""
+    return {
+        "email": record["email"],
+        "phone": record["phone"],
+        "full_name": record["full_name"],
+        "company": record["company_email"],
+        "service": record["service_title"],
+        "response_date": record["response_date"]
+    }
+
+
+def read(consumer: str) -> List[Tuple[bytes, Optional[Dict[str, Any]]]]:
+    """Read next batch of stream entries for 'consumer'. Entries left unacknowledged by other
+    consumers for 'RESPONSE_CLAIM_IDLE' milliseconds are claimed first, so nothing is lost.
+    Record of claimed entry, which was already deleted from the stream, is None."""
+    try:
+        redis.xgroup_create(RESPONSE_STREAM_KEY, RESPONSE_GROUP, id="0", mkstream=True)
+    except ResponseError:
+        pass  # Group already exists
+
+    stale = [
+        entry["message_id"]
+        for entry in redis.xpending_range(RESPONSE_STREAM_KEY, RESPONSE_GROUP, "-", "+", settings.RESPONSE_BATCH)
+        if entry["time_since_delivered"] >= settings.RESPONSE_CLAIM_IDLE
+    ]
+    entries = redis.xclaim(RESPONSE_STREAM_KEY, RESPONSE_GROUP, consumer, settings.RESPONSE_CLAIM_IDLE, stale) \
+        if stale else []
+
+    if len(entries) < settings.RESPONSE_BATCH:
+        streams = redis.xreadgroup(RESPONSE_GROUP, consumer, {RESPONSE_STREAM_KEY: ">"},
+                                   count=settings.RESPONSE_BATCH - len(entries))
+        entries += [entry for _, stream in streams for entry in stream]
+
+    return [(entry_id, json.loads(fields[b"record"]) if fields else None) for entry_id, fields in entries]
+
+
+def unnotified(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Mark records as notified. Return those, which were not marked before."""
+    pipeline = redis.pipeline(transaction=False)
+    for record in records:
+        pipeline.set(notified_key(record["key"]), 1, nx=True, ex=NOTIFIED_TIMEOUT)
+    return [record for record, marked in zip(records, pipeline.execute()) if marked]
+
+
+def consume(consumer: str, notify: Callable[[Dict[str, Any]], None]) -> int:
+    """Write up to 'RESPONSE_MAX_BATCHES' batches of streamed responses into database with 'bulk_create'.
+    Records with known idempotency keys are not written again. After commit every saved record is passed
+    to 'notify' once, also when its entry is redelivered, and then entries are acknowledged.
+    Return number of created responses."""
+    created = 0
+
+    for _ in range(settings.RESPONSE_MAX_BATCHES):
+        entries = read(consumer)
+        if not entries:
+            break
+
+        records = {UUID(record["key"]): record for _, record in entries if record is not None}
+        with transaction.atomic():
+            existing = set(Response.objects.filter(key__in=records).values_list("key", flat=True))
+            services = set(Service.objects.filter(
+                pk__in=[record["service"] for record in records.values()]
+            ).values_list("pk", flat=True))
+
+            # Responses to services deleted after submit are dropped
+            new = [
+                record for key, record in records.items()
+                if key not in existing and record["service"] in services
+            ]
+            Response.objects.bulk_create([
+                Response(
+                    key=record["key"],
+                    full_name=record["full_name"],
+                    email=record["email"],
+                    phone=record["phone"],
+                    birth_date=record["birth_date"],
+                    service_id=record["service"],
+                    company_id=record["company"]
+                )
+                for record in new
+            ], ignore_conflicts=True)
+
+        # Existing records may be committed by a consumer, which crashed before acknowledging them
+        saved = [record for key, record in records.items() if key in existing or record["service"] in services]
+        for record in unnotified(saved):
+            notify(record)
+
+        ids = [entry_id for entry_id, _ in entries]
+        pipeline = redis.pipeline(transaction=False)
+        pipeline.xack(RESPONSE_STREAM_KEY, RESPONSE_GROUP, *ids)
+        pipeline.xdel(RESPONSE_STREAM_KEY, *ids)
+        pipeline.execute()
+
+        created += len(new)
+
+    return created
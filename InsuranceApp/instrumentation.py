@@ -0,0 +1,143 @@
+import heapq
+import aioredis
+import threading
+
+from time import perf_counter
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from redis import StrictRedis
+from redis.client import Pipeline
+from elasticsearch import Urllib3HttpConnection, AIOHttpConnection
+
+# Backends, whose calls are counted and timed per request
+BACKENDS = ["db", "es", "redis", "template"]
+
+# Longest calls, kept per request for the slow requests log
+TOP_CALLS = 5
+
+
+class Timings:
+    """Counts and durations of backend calls, made while handling one request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.top: List[Tuple[float, str, str]] = list()
+
+    def record(self, backend: str, label: str, seconds: float) -> None:
+        """Add call of backend. Async views record from several threads and tasks at once."""
+        with self._lock:
+            self.calls[backend] += 1
+            self.seconds[backend] += seconds
+            if len(self.top) < TOP_CALLS:
+                heapq.heappush(self.top, (seconds, backend, label))
+            elif seconds > self.top[0][0]:
+                heapq.heapreplace(self.top, (seconds, backend, label))
+
+    def offenders(self) -> List[Tuple[float, str, str]]:
+        """Return longest calls, from the longest one"""
+        with self._lock:
+            return sorted(self.top, reverse=True)
+
+
+# Timings of the current request, None outside of requests
+timings: ContextVar[Optional[Timings]] = ContextVar("timings", default=None)
+
+
+def record(backend: str, label: str, seconds: float) -> None:
+    """Add call of backend to timings of the current request, if there is one"""
+    current = timings.get()
+    if current is not None:
+        current.record(backend, label[:200], seconds)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """Database execute wrapper, that times every query"""
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record("db", sql, perf_counter() - started)
+
+
+def install_sql_wrapper(sender, connection, **kwargs) -> None:
+    """Receiver of 'connection_created' signal, that wraps queries of the new connection"""
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+class InstrumentedConnection(Urllib3HttpConnection):
+    """Elasticsearch connection, that times every request"""
+
+    def perform_request(self, method, url, *args, **kwargs):
+        started = perf_counter()
+        try:
+            return super().perform_request(method, url, *args, **kwargs)
+        finally:
+            record("es", f"{method} {url}", perf_counter() - started)
+
+
+class InstrumentedAsyncConnection(AIOHttpConnection):
+    """Async elasticsearch connection, that times every request"""
+
+    async def perform_request(self, method, url, *args, **kwargs):
+        started = perf_counter()
+        try:
+            return await super().perform_request(method, url, *args, **kwargs)
+        finally:
+            record("es", f"{method} {url}", perf_counter() - started)
+
+
+class InstrumentedPipeline(Pipeline):
+    """Redis pipeline, that times every round trip"""
+
+    def execute(self, raise_on_error=True):
+        commands = " ".join(str(args[0]) for args, _ in self.command_stack)
+        started = perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            record("redis", f"PIPELINE {commands}", perf_counter() - started)
+
+
+class InstrumentedRedis(StrictRedis):
+    """Redis client, that times every command and pipeline"""
+
+    def execute_command(self, *args, **options):
+        started = perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            record("redis", str(args[0]), perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(aioredis.client.Pipeline):
+    """Async redis pipeline, that times every round trip"""
+
+    async def execute(self, raise_on_error=True):
+        commands = " ".join(str(args[0]) for args, _ in self.command_stack)
+        started = perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            record("redis", f"PIPELINE {commands}", perf_counter() - started)
+
+
+class InstrumentedAsyncRedis(aioredis.Redis):
+    """Async redis client, that times every command and pipeline"""
+
+    async def execute_command(self, *args, **options):
+        started = perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record("redis", str(args[0]), perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,177 @@
+import re
+import json
+import time
+import random
+import statistics
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max, Min
+from django.test import Client
+from django.core.management.base import BaseCommand, CommandError
+
+from InsuranceApp.models import Company, Service
+
+ROUTES = ["index", "suggest", "service", "services", "responses", "create_service"]
+
+# Title prefix of services, created by 'create_service' route and deleted after the run
+BENCHMARK_TITLE = "Benchmark service"
+
+SERVER_TIMING = re.compile(r'(\w+);dur=[\d.]+;desc="(\d+) calls"')
+
+
+class Command(BaseCommand):
+    """Management command, that measures latency of the main pages against database, elasticsearch and redis"""
+    help = "Request routes at fixed concurrency in-process, report p50/p95/p99 latency, " \
+           "queries per request and throughput, and compare them with a saved baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--routes", nargs="+", choices=ROUTES, default=ROUTES, help="Routes to benchmark")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per route")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+        parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per route")
+        parser.add_argument("--seed", type=int, default=42, help="Seed of random request parameters")
+        parser.add_argument("--company", help="Email of the company to log in as, the busiest one by default")
+        parser.add_argument("--baseline", default=str(settings.BASE_DIR / "benchmarks" / "baseline.json"),
+                            help="Baseline file to compare with")
+        parser.add_argument("--save", action="store_true", help="Save results as the new baseline")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative growth of p95 latency")
+
+    def handle(self, *args, **options):
+        company = self.get_company(options["company"])
+        rng = random.Random(options["seed"])
+
+        # Services are sampled by random keys, because sorting millions of rows randomly is a benchmark by itself
+        span = Service.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        if span["low"] is None:
+            raise CommandError("There are no services, run 'generate_data' first")
+        keys = [rng.randint(span["low"], span["high"]) for _ in range(5000)]
+        service_ids = sorted(Service.objects.filter(pk__in=keys).values_list("pk", flat=True))
+        service = Service.objects.get(pk=service_ids[0])
+
+        words = [word for title in Service.objects.filter(pk__in=service_ids[:100]).values_list("title", flat=True)
+                 for word in title.split()]
+
+        requests: Dict[str, Callable[[Client], Any]] = {
+            "index": lambda client: client.get("/", {"query": rng.choice(words), "page": rng.randint(1, 5)}),
+            "suggest": lambda client: client.get("/suggest", {"prefix": rng.choice(words)[:rng.randint(1, 4)]}),
+            "service": lambda client: client.get(f"/services/{rng.choice(service_ids)}"),
+            "services": lambda client: client.get("/services"),
+            "responses": lambda client: client.get("/responses"),
+            "create_service": lambda client: client.post("/create_service", {
+                "title": f"{BENCHMARK_TITLE} {rng.randrange(10 ** 6)}", "description": "Benchmark",
+                "coverage_amount": 100000, "price": 1000, "type": service.type_id, "validity": service.validity_id
+            })
+        }
+
+        results = dict()
+        try:
+            for route in options["routes"]:
+                results[route] = self.run(company, requests[route], options)
+                self.report(route, results[route])
+        finally:
+            Service.objects.filter(company=company, title__startswith=BENCHMARK_TITLE).delete()
+
+        self.compare(results, options)
+
+    @staticmethod
+    def get_company(email: str) -> Company:
+        """Return company by email, or the company with the most responses"""
+        if email is not None:
+            return Company.objects.get(email=email)
+
+        company = Company.objects.annotate(responses=Count("response")).order_by("-responses").first()
+        if company is None:
+            raise CommandError("There are no companies, run 'generate_data' first")
+
+        return company
+
+    def run(self, company: Company, request: Callable[[Client], Any], options: Dict) -> Dict[str, Any]:
+        """Send requests from 'concurrency' logged in clients. Return latency percentiles in milliseconds,
+        backend calls per request, throughput and number of failed requests."""
+
+        def worker(count: int) -> List[Tuple[float, Dict[str, int], bool]]:
+            client = Client()
+            client.force_login(company)
+            samples = list()
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = request(client)
+                    elapsed = time.perf_counter() - started
+
+                    timing = response.get("Server-Timing", "")
+                    calls = {backend: int(number) for backend, number in SERVER_TIMING.findall(timing)}
+                    samples.append((elapsed, calls, response.status_code >= 400))
+            finally:
+                connections.close_all()
+
+            return samples
+
+        concurrency = options["concurrency"]
+        counts = [options["requests"] // concurrency + (n < options["requests"] % concurrency)
+                  for n in range(concurrency)]
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(worker, [options["warmup"] // concurrency + 1] * concurrency))
+
+            started = time.perf_counter()
+            samples = [sample for samples in executor.map(worker, counts) for sample in samples]
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency, _, _ in samples]
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "requests": len(samples),
+            "failed": sum(failed for _, _, failed in samples),
+            "p50": round(percentiles[49], 1),
+            "p95": round(percentiles[94], 1),
+            "p99": round(percentiles[98], 1),
+            "throughput": round(len(samples) / elapsed, 1),
+            "calls": {
+                backend: round(sum(calls.get(backend, 0) for _, calls, _ in samples) / len(samples), 1)
+                for backend in ["db", "es", "redis"]
+            }
+        }
+
+    def report(self, route: str, result: Dict[str, Any]) -> None:
+        """Write result of route as one line"""
+        calls = ", ".join(f"{backend} {count}" for backend, count in result["calls"].items())
+        self.stdout.write(
+            f"{route:<16} p50 {result['p50']:>8}ms  p95 {result['p95']:>8}ms  p99 {result['p99']:>8}ms  "
+            f"{result['throughput']:>7} req/s  calls per request: {calls}  failed: {result['failed']}"
+        )
+
+    def compare(self, results: Dict[str, Dict[str, Any]], options: Dict) -> None:
+        """Compare results with baseline, failing on grown p95 latency or database queries. Save baseline if asked."""
+        path = Path(options["baseline"])
+        if options["save"]:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            baseline = json.loads(path.read_text()) if path.exists() else dict()
+            baseline.update(results)
+            path.write_text(json.dumps(baseline, indent=4, sort_keys=True))
+            self.stdout.write(f"Baseline saved to {path}")
+            return
+
+        if not path.exists():
+            return
+
+        baselines, regressions = json.loads(path.read_text()), list()
+        for route, result in results.items():
+            baseline = baselines.get(route)
+            if baseline is None:
+                continue
+
+            if result["p95"] > baseline["p95"] * (1 + options["tolerance"]):
+                regressions.append(f"{route}: p95 {baseline['p95']}ms -> {result['p95']}ms")
+            if result["calls"]["db"] > baseline["calls"]["db"]:
+                regressions.append(f"{route}: queries {baseline['calls']['db']} -> {result['calls']['db']}")
+
+        if regressions:
+            raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}"))
@@ -0,0 +1,142 @@
+import io
+import csv
+import time
+import random
+
+from array import array
+from datetime import date, timedelta
+from typing import Callable, Iterator, List
+
+from django.db import connection
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from InsuranceApp.cache import bump_search_generation
+from InsuranceApp.models import Company, InsuranceType, ValidityType, Service, Response
+from InsuranceApp.references import insurance_types, validity_types
+
+WORDS = [
+    "basic", "premium", "family", "travel", "home", "auto", "health", "life", "secure", "plus", "gold", "silver",
+    "standard", "extended", "comfort", "optimal", "student", "senior", "business", "express", "total", "smart"
+]
+NAMES = ["Anna", "Ivan", "Maria", "Alexey", "Olga", "Dmitry", "Elena", "Sergey", "Irina", "Pavel", "Natalia", "Oleg"]
+SURNAMES = ["Ivanov", "Petrov", "Sidorov", "Smirnov", "Kuznetsov", "Popov", "Volkov", "Sokolov", "Lebedev", "Kozlov"]
+
+SERVICE_COLUMNS = ["title", "description", "type_id", "validity_id", "coverage_amount", "price", "company_id"]
+RESPONSE_COLUMNS = [
+    "full_name", "email", "phone", "birth_date", "response_date", "create_time", "service_id", "company_id"
+]
+
+
+class Command(BaseCommand):
+    """Management command, that fills database with reproducible synthetic data for load tests"""
+    help = "Generate companies, services and responses from a seed, written with bulk_create and COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--companies", type=int, default=100, help="Number of companies")
+        parser.add_argument("--services", type=int, default=100000, help="Number of services")
+        parser.add_argument("--responses", type=int, default=1000000, help="Number of responses")
+        parser.add_argument("--seed", type=int, default=42, help="Seed of random generator")
+        parser.add_argument("--batch", type=int, default=100000, help="Rows per COPY statement")
+        parser.add_argument("--password", default="benchmark", help="Password of generated companies")
+        parser.add_argument("--no-index", action="store_true", help="Do not rebuild search index afterwards")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+
+        if not InsuranceType.objects.exists() or not ValidityType.objects.exists():
+            call_command("loaddata", "initial_data", verbosity=0)
+            insurance_types.reset()
+            validity_types.reset()
+
+        types = list(InsuranceType.objects.values_list("pk", flat=True))
+        validities = list(ValidityType.objects.values_list("pk", flat=True))
+
+        companies = self.create_companies(options)
+        self.stdout.write(f"Companies: {len(companies)}")
+
+        services_before = Service.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        self.copy(Service, SERVICE_COLUMNS, options["services"], options["batch"],
+                  lambda: self.service_row(rng, companies, types, validities))
+
+        # Responses reference generated services, with a skew towards popular ones
+        services, owners = array("q"), array("q")
+        for pk, company in Service.objects.filter(pk__gt=services_before).order_by("pk").values_list("pk", "company"):
+            services.append(pk)
+            owners.append(company)
+        if options["responses"] and not services:
+            raise CommandError("No services to generate responses for")
+
+        self.copy(Response, RESPONSE_COLUMNS, options["responses"], options["batch"],
+                  lambda: self.response_row(rng, services, owners))
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Service._meta.db_table)}")
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(Response._meta.db_table)}")
+
+        if not options["no_index"]:
+            call_command("rebuild_search_index", stdout=self.stdout)
+        bump_search_generation()
+
+    def create_companies(self, options) -> List[int]:
+        """Create companies, named by seed so that the same seed gives the same companies. Return their keys."""
+        password = make_password(options["password"])
+        emails = [f"company-{options['seed']}-{number}@example.com" for number in range(options["companies"])]
+        Company.objects.bulk_create([
+            Company(
+                email=email, username=f"company{number}", name=f"Company {number} ({options['seed']})",
+                phone=f"+7900{number:07d}", password=password, description="Synthetic company"
+            )
+            for number, email in enumerate(emails)
+        ], ignore_conflicts=True)
+
+        return list(Company.objects.filter(email__in=emails).order_by("pk").values_list("pk", flat=True))
+
+    def copy(self, model, columns: List[str], total: int, batch: int, row: Callable[[], List]) -> None:
+        """Write 'total' generated rows into table of 'model' by COPY statements of 'batch' rows"""
+        table = connection.ops.quote_name(model._meta.db_table)
+        statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+        started, written = time.monotonic(), 0
+        for size in self.batches(total, batch):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for _ in range(size):
+                writer.writerow(row())
+            buffer.seek(0)
+
+            with connection.cursor() as cursor:
+                cursor.copy_expert(statement, buffer)
+
+            written += size
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{model.__name__}: {written} of {total}, {written / elapsed:.0f} rows/s")
+
+    @staticmethod
+    def batches(total: int, batch: int) -> Iterator[int]:
+        """Return sizes of batches, which sum up to 'total'"""
+        for start in range(0, total, batch):
+            yield min(batch, total - start)
+
+    @staticmethod
+    def service_row(rng: random.Random, companies: List[int], types: List[int], validities: List[int]) -> List:
+        """Return random row of 'SERVICE_COLUMNS'"""
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))).capitalize()
+        description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))
+        coverage = rng.randrange(1000, 1000000, 1000)
+        price = round(coverage * rng.uniform(0.005, 0.05), 2)
+        return [title, description, rng.choice(types), rng.choice(validities), coverage, price, rng.choice(companies)]
+
+    @staticmethod
+    def response_row(rng: random.Random, services: array, owners: array) -> List:
+        """Return random row of 'RESPONSE_COLUMNS' for a service, chosen with a skew towards the first ones"""
+        index = int(len(services) * rng.random() ** 3)
+        name, surname = rng.choice(NAMES), rng.choice(SURNAMES)
+        birth_date = date(1950, 1, 1) + timedelta(days=rng.randrange(20000))
+        response_date = date.today() - timedelta(days=rng.randrange(730))
+        return [
+            f"{name} {surname}", f"{name}.{surname}{rng.randrange(10000)}@example.com".lower(),
+            f"+7{rng.randrange(10 ** 10):010d}", birth_date, response_date, response_date,
+            services[index], owners[index]
+        ]
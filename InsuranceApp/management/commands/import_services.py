@@ -0,0 +1,37 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from InsuranceApp.models import Company
+from InsuranceApp.imports import IMPORT_FORMATS, get_import_format, read_rows, import_services
+
+
+class Command(BaseCommand):
+    """Management command, that imports services of a company from CSV, JSON or JSON Lines file"""
+    help = "Create and update services of a company in bulk, reporting errors of invalid rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Path to file with services, rows with 'id' update existing services")
+        parser.add_argument("--company", required=True, help="Email of the company, which owns the services")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format, detected by extension by default")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(email=options["company"])
+        except Company.DoesNotExist:
+            raise CommandError(f"Company '{options['company']}' does not exist")
+
+        with open(options["file"], "rb") as file:
+            try:
+                report = import_services(company, read_rows(file, options["format"] or get_import_format(file.name)))
+            except (ValueError, csv.Error) as error:
+                raise CommandError(f"Malformed file: {error}")
+
+        for error in report["errors"]:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{len(report['errors'])} invalid, {report['rows_per_second']} rows/s"
+        ))
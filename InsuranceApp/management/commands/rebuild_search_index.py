@@ -0,0 +1,138 @@
+import os
+import time
+import multiprocessing
+
+from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
+from django.core.management.base import BaseCommand, CommandError
+from elasticsearch.helpers import parallel_bulk
+from elasticsearch_dsl.connections import connections as es_connections
+
+from InsuranceApp.cache import bump_search_generation
+from InsuranceApp.documents import ServiceDocument
+from InsuranceApp.indexing import pause_queue, resume_queue, flush_queue
+
+
+def connect_worker() -> None:
+    """Process pool initializer, that opens own elasticsearch connection in the forked worker"""
+    es_connections.create_connection("default", **settings.ELASTICSEARCH_DSL["default"])
+
+
+def index_range(index: str, bounds: Tuple[int, int], chunk_size: int, threads: int) -> int:
+    """Stream services with primary keys in 'bounds' through server-side cursor into 'index'.
+    Return number of indexed documents."""
+    document = ServiceDocument()
+    services = document.get_queryset().filter(pk__range=bounds).order_by("pk").iterator(chunk_size=chunk_size)
+    actions = (
+        {"_index": index, "_id": document.generate_id(service), "_source": document.prepare(service)}
+        for service in services
+    )
+
+    indexed = 0
+    for success, _ in parallel_bulk(es_connections.get_connection(), actions,
+                                    thread_count=threads, chunk_size=chunk_size, raise_on_error=True):
+        indexed += success
+
+    return indexed
+
+
+class Command(BaseCommand):
+    """Management command, that rebuilds search index without downtime behind an alias"""
+    help = "Build a new timestamped 'service' index in parallel and atomically swap the alias onto it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+        parser.add_argument("--threads", type=int, default=2, help="Bulk threads per worker process")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per cursor fetch and bulk request")
+        parser.add_argument("--range-size", type=int, default=20000, help="Primary keys per worker task")
+        parser.add_argument("--keep-old", action="store_true", help="Keep previous indices after the swap")
+
+    def handle(self, *args, **options):
+        client = es_connections.get_connection()
+        alias = ServiceDocument._index._name
+        name = f"{alias}-{time.strftime('%Y%m%d%H%M%S')}"
+        replicas = ServiceDocument._index._settings.get("number_of_replicas", 1)
+
+        # Replicas and refresh are turned off during the load and restored before the swap
+        index = ServiceDocument._index.clone(name=name)
+        index.settings(number_of_replicas=0, refresh_interval="-1")
+        index.create()
+        self.stdout.write(f"Created index '{name}'")
+
+        # Queued changes are held back during the load, and flushed into the new index after the swap
+        pause_queue()
+        try:
+            indexed = self.load(name, options)
+
+            client.indices.put_settings(index=name, body={
+                "index": {"number_of_replicas": replicas, "refresh_interval": None}
+            })
+            client.indices.refresh(index=name)
+
+            count = client.count(index=name)["count"]
+            if count != indexed:
+                raise CommandError(f"Index '{name}' has {count} of {indexed} indexed documents, alias is not swapped")
+
+            old = self.swap(alias, name)
+        except BaseException:
+            # Index, which never got behind the alias, is dropped also when the load is failed or interrupted
+            client.indices.delete(index=name, ignore=[404])
+            self.stderr.write(f"Deleted index '{name}'")
+            raise
+        finally:
+            resume_queue()
+
+        bump_search_generation()
+        self.stdout.write(self.style.SUCCESS(f"Alias '{alias}' swapped to '{name}'"))
+        self.stdout.write(f"Flushed {flush_queue()} queued changes")
+
+        if old and not options["keep_old"]:
+            client.indices.delete(index=",".join(old))
+            self.stdout.write(f"Deleted {', '.join(old)}")
+
+    def load(self, name: str, options: Dict) -> int:
+        """Index all services into 'name' by primary key ranges across process pool. Return number of documents."""
+        span = ServiceDocument().get_queryset().aggregate(low=Min("pk"), high=Max("pk"))
+        if span["low"] is None:
+            return 0
+
+        size = options["range_size"]
+        ranges = [(low, low + size - 1) for low in range(span["low"], span["high"] + 1, size)]
+
+        # Database connections must not be shared with forked workers
+        connections.close_all()
+
+        started, indexed = time.monotonic(), 0
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(options["workers"], mp_context=context, initializer=connect_worker) as executor:
+            futures = [
+                executor.submit(index_range, name, bounds, options["chunk_size"], options["threads"])
+                for bounds in ranges
+            ]
+            for future in as_completed(futures):
+                indexed += future.result()
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Indexed {indexed} documents, {indexed / elapsed:.0f} docs/s")
+
+        return indexed
+
+    def swap(self, alias: str, name: str) -> List[str]:
+        """Atomically point 'alias' to index 'name'. Return names of indices, previously behind the alias."""
+        client = es_connections.get_connection()
+
+        if client.indices.exists_alias(name=alias):
+            old = list(client.indices.get_alias(name=alias))
+            actions = [{"remove": {"index": index, "alias": alias}} for index in old]
+        elif client.indices.exists(index=alias):
+            # First rebuild replaces concrete index, created by 'search_index', in the same atomic request
+            old, actions = [], [{"remove_index": {"index": alias}}]
+        else:
+            old, actions = [], []
+
+        actions.append({"add": {"index": name, "alias": alias}})
+        client.indices.update_aliases(body={"actions": actions})
+        return old
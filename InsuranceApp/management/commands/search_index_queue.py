@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from InsuranceApp.indexing import get_queue_stats, flush_queue
+
+
+class Command(BaseCommand):
+    """Management command, that reports depth and lag of the search index queue"""
+    help = "Show depth and lag of the search index queue, optionally flushing it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flush", action="store_true", help="Flush the queue in this process")
+
+    def handle(self, *args, **options):
+        stats = get_queue_stats()
+        self.stdout.write(f"Queued: {stats['depth']}, lag: {stats['lag']:.1f}s")
+
+        if options["flush"]:
+            self.stdout.write(f"Flushed: {flush_queue()}")
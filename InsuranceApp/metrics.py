@@ -0,0 +1,127 @@
+from time import perf_counter
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from celery.signals import task_prerun, task_postrun
+from redis.client import Pipeline
+
+from .cache import redis
+from .instrumentation import Timings
+from .indexing import get_queue_stats
+from .notifications import get_stats as get_notification_stats
+
+REQUEST_METRICS_KEY = "metrics/requests"
+BACKEND_METRICS_KEY = "metrics/backends"
+TASK_METRICS_KEY = "metrics/tasks"
+
+# Upper bounds of latency histogram buckets, in seconds
+BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Start times of tasks, running in this worker process
+_started: Dict[str, float] = dict()
+
+
+def observe(pipeline: Pipeline, key: str, name: str, seconds: float, failed: bool = False) -> None:
+    """Add duration of 'name' to histogram in redis hash 'key'. Buckets are cumulative, as Prometheus expects."""
+    pipeline.hincrby(key, f"{name}|count", 1)
+    pipeline.hincrbyfloat(key, f"{name}|sum", seconds)
+    for bound in BUCKETS:
+        if seconds <= bound:
+            pipeline.hincrby(key, f"{name}|le|{bound}", 1)
+
+    if failed:
+        pipeline.hincrby(key, f"{name}|failures", 1)
+
+
+def record_request(view: str, timings: Timings, seconds: float) -> None:
+    """Add duration of request to 'view' and its backend calls to shared metrics in one round trip"""
+    pipeline = redis.pipeline(transaction=False)
+    observe(pipeline, REQUEST_METRICS_KEY, view, seconds)
+    for backend, calls in timings.calls.items():
+        pipeline.hincrby(BACKEND_METRICS_KEY, f"{backend}|calls", calls)
+        pipeline.hincrbyfloat(BACKEND_METRICS_KEY, f"{backend}|seconds", timings.seconds[backend])
+    pipeline.execute()
+
+
+@task_prerun.connect
+def start_task(task_id: str, **kwargs) -> None:
+    """Receiver of 'task_prerun' signal, that remembers start time of task"""
+    _started[task_id] = perf_counter()
+
+
+@task_postrun.connect
+def finish_task(task_id: str, task, state: str = None, **kwargs) -> None:
+    """Receiver of 'task_postrun' signal, that adds duration of task to shared metrics"""
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+
+    pipeline = redis.pipeline(transaction=False)
+    observe(pipeline, TASK_METRICS_KEY, task.name, perf_counter() - started, failed=state == "FAILURE")
+    pipeline.execute()
+
+
+def read_histograms(key: str) -> Dict[str, Dict[str, float]]:
+    """Return histograms of redis hash 'key' by name"""
+    histograms: Dict[str, Dict[str, float]] = defaultdict(dict)
+    for field, value in redis.hgetall(key).items():
+        name, metric = field.decode().split("|", 1)
+        histograms[name][metric] = float(value)
+
+    return histograms
+
+
+def render_histograms(metric: str, label: str, key: str) -> List[str]:
+    """Render histograms of redis hash 'key' in Prometheus text format"""
+    lines = [f"# TYPE {metric} histogram"]
+    failures: List[Tuple[str, float]] = list()
+
+    for name, values in sorted(read_histograms(key).items()):
+        for bound in BUCKETS:
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {values.get(f"le|{bound}", 0):.0f}')
+        lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {values.get("count", 0):.0f}')
+        lines.append(f'{metric}_sum{{{label}="{name}"}} {values.get("sum", 0)}')
+        lines.append(f'{metric}_count{{{label}="{name}"}} {values.get("count", 0):.0f}')
+        if "failures" in values:
+            failures.append((name, values["failures"]))
+
+    if failures:
+        lines.append(f"# TYPE {metric}_failures_total counter")
+        lines += [f'{metric}_failures_total{{{label}="{name}"}} {value:.0f}' for name, value in failures]
+
+    return lines
+
+
+def render_metrics() -> str:
+    """Render shared metrics of web and worker processes in Prometheus text format"""
+    lines = render_histograms("insurance_request_duration_seconds", "view", REQUEST_METRICS_KEY)
+    lines += render_histograms("insurance_task_duration_seconds", "task", TASK_METRICS_KEY)
+
+    backends = read_histograms(BACKEND_METRICS_KEY)
+    lines.append("# TYPE insurance_backend_calls_total counter")
+    lines += [f'insurance_backend_calls_total{{backend="{name}"}} {values.get("calls", 0):.0f}'
+              for name, values in sorted(backends.items())]
+    lines.append("# TYPE insurance_backend_duration_seconds_total counter")
+    lines += [f'insurance_backend_duration_seconds_total{{backend="{name}"}} {values.get("seconds", 0)}'
+              for name, values in sorted(backends.items())]
+
+    queue = get_queue_stats()
+    lines += [
+        "# TYPE insurance_index_queue_depth gauge",
+        f"insurance_index_queue_depth {queue['depth']}",
+        "# TYPE insurance_index_queue_lag_seconds gauge",
+        f"insurance_index_queue_lag_seconds {queue['lag']}"
+    ]
+
+    notifications = get_notification_stats()
+    for name in ["sent", "failed", "notifications"]:
+        lines += [
+            f"# TYPE insurance_notifications_{name}_total counter",
+            f"insurance_notifications_{name}_total {notifications.get(name, 0):.0f}"
+        ]
+    lines += [
+        "# TYPE insurance_notifications_send_seconds_total counter",
+        f"insurance_notifications_send_seconds_total {notifications.get('seconds', 0)}"
+    ]
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+from time import perf_counter
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from asgiref.sync import sync_to_async
+
+from .metrics import record_request
+from .instrumentation import BACKENDS, Timings, timings
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware:
+    """Middleware, that counts and times database queries, elasticsearch requests, redis commands and template
+    rendering of every request. Timings are returned in 'Server-Timing' header, added to shared metrics,
+    and requests slower than 'SLOW_REQUEST_THRESHOLD' seconds are logged with their longest calls."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request: HttpRequest):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        current, started = Timings(), perf_counter()
+        token = timings.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            timings.reset(token)
+
+        self.finish(request, response, current, perf_counter() - started)
+        return response
+
+    async def __acall__(self, request: HttpRequest):
+        current, started = Timings(), perf_counter()
+        token = timings.set(current)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings.reset(token)
+
+        await sync_to_async(self.finish, thread_sensitive=False)(request, response, current, perf_counter() - started)
+        return response
+
+    def process_template_response(self, request: HttpRequest, response):
+        current, started = timings.get(), perf_counter()
+        if current is not None:
+            names = response.template_name
+            name = names if isinstance(names, str) else ", ".join(str(name) for name in names or [])
+            response.add_post_render_callback(
+                lambda rendered: current.record("template", name, perf_counter() - started)
+            )
+
+        return response
+
+    def finish(self, request: HttpRequest, response: HttpResponse, current: Timings, seconds: float) -> None:
+        """Add timings to response header, slow requests log and shared metrics"""
+        response["Server-Timing"] = ", ".join([
+            f'{backend};dur={current.seconds[backend] * 1000:.1f};desc="{current.calls[backend]} calls"'
+            for backend in BACKENDS if current.calls[backend]
+        ] + [f"total;dur={seconds * 1000:.1f}"])
+
+        if seconds > settings.SLOW_REQUEST_THRESHOLD:
+            summary = ", ".join(
+                f"{backend} {current.calls[backend]} calls {current.seconds[backend] * 1000:.0f}ms"
+                for backend in BACKENDS if current.calls[backend]
+            )
+            offenders = "; ".join(
+                f"{backend} {duration * 1000:.0f}ms {label}" for duration, backend, label in current.offenders()
+            )
+            logger.warning("Slow request %s %s %.0fms: %s. Longest calls: %s",
+                           request.method, request.get_full_path(), seconds * 1000, summary, offenders)
+
+        view = request.resolver_match.view_name if request.resolver_match is not None else "unmatched"
+        try:
+            record_request(view, current, seconds)
+        except Exception:
+            logger.exception("Failed to record request metrics")
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('InsuranceApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='key',
+            field=models.UUIDField(null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:37
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking writes to the responses table
+    atomic = False
+
+    dependencies = [
+        ('InsuranceApp', '0002_response_key'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='response',
+            index=models.Index(fields=['company', '-response_date', '-id'], name='response_company_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='response',
+            index=models.Index(fields=['company', 'full_name', 'id'], name='response_company_name_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:49
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index is built without locking writes to the services table
+    atomic = False
+
+    dependencies = [
+        ('InsuranceApp', '0003_response_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='service',
+            index=models.Index(fields=['company', 'title', 'id'], name='service_company_title_idx'),
+        ),
+    ]
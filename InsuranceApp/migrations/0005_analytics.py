@@ -0,0 +1,43 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('InsuranceApp', '0004_service_company_title_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('update_date', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ServiceDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('responses', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='InsuranceApp.service')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='servicedailystats',
+            index=models.Index(fields=['company', 'date'], name='service_stats_company_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='servicedailystats',
+            constraint=models.UniqueConstraint(fields=('service', 'date'), name='service_daily_stats_unique'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('InsuranceApp', '0005_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='create_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
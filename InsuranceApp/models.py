@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.contrib.postgres.fields import ArrayField
 
@@ -42,6 +43,10 @@ class Service(models.Model):
     price = models.FloatField()
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
 
+    class Meta:
+        """Composite index, that serves keyset pagination of company services by title"""
+        indexes = [models.Index(fields=["company", "title", "id"], name="service_company_title_idx")]
+
 
 class Response(models.Model):
     """Response model for represent response by client for 'company'"""
@@ -52,3 +57,37 @@ class Response(models.Model):
     response_date = models.DateField(auto_now_add=True)
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
+
+    # Idempotency key of submitted response form, which deduplicates redelivered and resubmitted responses
+    key = models.UUIDField(null=True, unique=True)
+
+    # Time the response was created at, which tells analytics rollup that its transaction is surely committed
+    create_time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """Composite indexes, that serve keyset pagination of company responses in each ordering"""
+        indexes = [
+            models.Index(fields=["company", "-response_date", "-id"], name="response_company_date_idx"),
+            models.Index(fields=["company", "full_name", "id"], name="response_company_name_idx")
+        ]
+
+
+class ServiceDailyStats(models.Model):
+    """Views and responses of 'service' per day, aggregated by analytics rollup"""
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    responses = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """One row per service and day, and index that serves analytics of company for a range of days"""
+        constraints = [models.UniqueConstraint(fields=["service", "date"], name="service_daily_stats_unique")]
+        indexes = [models.Index(fields=["company", "date"], name="service_stats_company_date_idx")]
+
+
+class RollupCheckpoint(models.Model):
+    """High-water mark of rollup 'name', that is the greatest key of rows already aggregated"""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    update_date = models.DateTimeField(auto_now=True)
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import get_template
+
+from .cache import redis
+
+NOTIFICATION_STATS_KEY = "metrics/notifications"
+
+
+def pending_key(company: str) -> str:
+    """Return redis key of notifications, waiting to be sent to 'company'"""
+    return f"notifications/{company}"
+
+
+def scheduled_key(company: str) -> str:
+    """Return redis key of flag, which is set while delivery to 'company' is scheduled"""
+    return f"notifications/{company}/scheduled"
+
+
+@lru_cache(maxsize=None)
+def get_session(pid: int) -> Session:
+    """Return HTTP session with pooled keep-alive connections and retries with backoff, one per worker process.
+    Only requests, which the mail provider did not accept, are retried, so that no mail is sent twice."""
+    retry = Retry(
+        total=settings.NOTIFICATION_RETRIES,
+        read=0,
+        backoff_factor=settings.NOTIFICATION_BACKOFF,
+        status_forcelist=[429, 503],
+        allowed_methods=frozenset(["POST"]),
+        raise_on_status=False
+    )
+    session = Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    return session
+
+
+@lru_cache(maxsize=None)
+def get_mail_template():
+    """Return compiled template of notification mail"""
+    return get_template("mail.html")
+
+
+def push(notification: Dict) -> bool:
+    """Add notification to pending ones of its company. Return True if delivery has to be scheduled."""
+    company = notification["company"]
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.rpush(pending_key(company), json.dumps(notification, cls=DjangoJSONEncoder))
+    pipeline.set(scheduled_key(company), 1, nx=True, ex=settings.NOTIFICATION_WINDOW + 60)
+    return pipeline.execute()[1] is True
+
+
+def pop(company: str) -> List[Dict]:
+    """Take all pending notifications of company"""
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.lrange(pending_key(company), 0, -1)
+    pipeline.delete(pending_key(company), scheduled_key(company))
+    notifications, _ = pipeline.execute()
+    return [json.loads(notification) for notification in notifications]
+
+
+def send(company: str, notifications: List[Dict]) -> None:
+    """Send notifications to company in one mail, or as a digest if there are several of them"""
+    if len(notifications) == 1:
+        subject = f"You have new response for «{notifications[0]['service']}»"
+    else:
+        subject = f"You have {len(notifications)} new responses"
+
+    params = {
+        "format": "json",
+        "api_key": os.getenv("UNISENDER_KEY", "api_key"),
+        "email": company,
+        "sender_name": os.getenv("COMPANY_NAME", "name"),
+        "sender_email": os.getenv("COMPANY_EMAIL", "email"),
+        "subject": subject,
+        "body": get_mail_template().render({"responses": notifications}),
+        "list_id": 1
+    }
+
+    started = time.monotonic()
+    try:
+        response = get_session(os.getpid()).post(
+            settings.NOTIFICATION_URL, data=params, timeout=settings.NOTIFICATION_TIMEOUT
+        )
+        response.raise_for_status()
+    except Exception:
+        record(failed=1, seconds=time.monotonic() - started)
+        raise
+
+    record(sent=1, notifications=len(notifications), seconds=time.monotonic() - started)
+
+
+def record(sent: int = 0, failed: int = 0, notifications: int = 0, seconds: float = 0.0) -> None:
+    """Add delivery results to shared statistics"""
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hincrby(NOTIFICATION_STATS_KEY, "sent", sent)
+    pipeline.hincrby(NOTIFICATION_STATS_KEY, "failed", failed)
+    pipeline.hincrby(NOTIFICATION_STATS_KEY, "notifications", notifications)
+    pipeline.hincrbyfloat(NOTIFICATION_STATS_KEY, "seconds", seconds)
+    pipeline.execute()
+
+
+def get_stats() -> Dict[str, Optional[float]]:
+    """Return delivery statistics: sent mails, failed sends, delivered notifications and sends per second"""
+    stats = {key.decode(): float(value) for key, value in redis.hgetall(NOTIFICATION_STATS_KEY).items()}
+    seconds = stats.get("seconds", 0.0)
+    stats["sends_per_second"] = (stats.get("sent", 0.0) + stats.get("failed", 0.0)) / seconds if seconds else None
+    return stats
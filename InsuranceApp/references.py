@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from typing import Dict, List, Optional, Tuple
+
+from .cache import redis, bump_service_pages
+from .models import InsuranceType, Service, ValidityType
+
+
+class ReferenceCache:
+    """Process-local cache of a small reference table, built lazily on first access.
+
+    Table version is kept in redis and checked at most every 'REFERENCE_CACHE_CHECK' seconds,
+    so a change in any process rebuilds the cache in every other process.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f"references/{model._meta.label_lower}/version"
+
+        self._objects: Optional[Dict[int, models.Model]] = None
+        self._version: Optional[bytes] = None
+        self._checked: float = 0.0
+
+    @property
+    def objects(self) -> Dict[int, models.Model]:
+        """Objects of the table by primary key, reloaded if the table version has changed"""
+        now = time.monotonic()
+        if self._objects is None or now - self._checked > settings.REFERENCE_CACHE_CHECK:
+            version = redis.get(self.version_key)
+            if self._objects is None or version != self._version:
+                self._objects = self.model.objects.in_bulk()
+                self._version = version
+
+            self._checked = now
+
+        return self._objects
+
+    def all(self) -> List[models.Model]:
+        """Return all objects of the table ordered by primary key"""
+        return [self.objects[pk] for pk in sorted(self.objects)]
+
+    def get(self, pk) -> models.Model:
+        """Return object by primary key, raising model's 'DoesNotExist' if it is missing"""
+        try:
+            return self.objects[int(pk)]
+        except (KeyError, TypeError, ValueError):
+            raise self.model.DoesNotExist(f"{self.model.__name__} with pk={pk!r} does not exist")
+
+    def choices(self) -> List[Tuple[int, str]]:
+        """Return (pk, name) choices for forms and filters"""
+        return [(obj.pk, obj.name) for obj in self.all()]
+
+    def invalidate(self, *args, **kwargs) -> None:
+        """Signal receiver, that drops cache after commit of a change in the table"""
+        transaction.on_commit(self.reset)
+
+    def reset(self) -> None:
+        """Drop cache of this process and bump table version for other processes"""
+        self._objects = None
+        redis.incr(self.version_key)
+
+
+def invalidate_service_pages(sender, instance: models.Model, created: bool = False, **kwargs) -> None:
+    """Signal receiver, that invalidates cached fragments of services, showing the name of changed reference,
+    after commit. Services are taken before delete, which removes them along with the reference."""
+    if created:
+        return
+
+    field = "type" if sender is InsuranceType else "validity"
+    service_ids = list(Service.objects.filter(**{field: instance}).values_list("pk", flat=True))
+    transaction.on_commit(lambda: bump_service_pages(service_ids))
+
+
+insurance_types = ReferenceCache(InsuranceType)
+validity_types = ReferenceCache(ValidityType)
+
+for reference in [insurance_types, validity_types]:
+    post_save.connect(reference.invalidate, sender=reference.model, weak=False)
+    post_delete.connect(reference.invalidate, sender=reference.model, weak=False)
+    post_save.connect(invalidate_service_pages, sender=reference.model)
+    pre_delete.connect(invalidate_service_pages, sender=reference.model)
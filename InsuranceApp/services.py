@@ -1,13 +1,291 @@
+import json
+import logging
+
+from math import isfinite
+from hashlib import sha1
+from datetime import date
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.conf import settings
 from django.http import HttpRequest
-from django.db.models import QuerySet
+from django.core.paginator import InvalidPage
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Count, Model, QuerySet
+from django.core.serializers.json import DjangoJSONEncoder
 from .documents import ServiceDocument
-from .models import Response
-from typing import Dict, List, Optional, Any
-from elasticsearch_dsl.query import MultiMatch
+from .cache import get_search_page, set_search_page, get_suggestions, set_suggestions, set_similar_services
+from .references import ReferenceCache, insurance_types, validity_types
+from .models import Response, Service
+from typing import Dict, List, Optional, Any, Tuple, Type, Union, NamedTuple
+from elasticsearch import ElasticsearchException
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response as SearchResponse
+from elasticsearch_dsl.query import MultiMatch, MoreLikeThis, Q
+
+logger = logging.getLogger(__name__)
+
+# Deepest position elasticsearch serves with 'from' and 'size' ('index.max_result_window' setting)
+MAX_RESULT_WINDOW = 10000
+
+# Deepest position, which is walked to with 'search_after' when the request has no cursor of the previous page
+MAX_WALK_DEPTH = 5 * MAX_RESULT_WINDOW
+
+# User-facing sort options and document fields, sorted by doc values
+SORTING: Dict[str, Dict[str, Any]] = {
+    "title": {"title.sort": "asc"},
+    "-title": {"title.sort": "desc"},
+    "price": {"price": "asc"},
+    "-price": {"price": "desc"},
+    "coverage_amount": {"coverage_amount": "asc"},
+    "-coverage_amount": {"coverage_amount": "desc"},
+    "-value": {"value": {"order": "desc", "missing": "_last"}}
+}
+
+# Range filters by request parameters '<name>_min' and '<name>_max', evaluated on doc values of document fields
+RANGES: Dict[str, str] = {"price": "price", "coverage": "coverage_amount"}
+
+# Fields with filter dropdowns, whose options are counted by terms aggregations
+FACETS = ["type", "validity", "company"]
+FACET_SIZE = 100
+
+# Facets, whose option names are taken from reference cache instead of indexed documents
+FACET_REFERENCES: Dict[str, ReferenceCache] = {"type": insurance_types, "validity": validity_types}
+
+# Number of autocomplete suggestions and the longest prefix they are looked up by
+SUGGEST_SIZE = 8
+SUGGEST_PREFIX_LENGTH = 50
+
+# Number of similar services and how many times their price and coverage may differ from the service's own
+SIMILAR_SIZE = 5
+SIMILAR_RANGE = 2
+
+# Orderings of responses inbox, each served by a composite index of 'Response' with company as the leading column
+RESPONSE_ORDERINGS: Dict[str, Tuple[str, str]] = {
+    "full_name": ("full_name", "id"),
+    "-response_date": ("-response_date", "-id")
+}
+
+# Ordering of services of company, served by the (company, title, id) index of 'Service'
+SERVICE_ORDERING: Tuple[str, str] = ("title", "id")
+
+# Indexed fields, which are enough to render services listings without database
+LISTING_FIELDS = [
+    "title", "price", "type.id", "type.name", "validity.id", "validity.name", "company.id", "company.name"
+]
+
+
+class Related(NamedTuple):
+    """Lightweight row of object related to service, taken from elasticsearch '_source'"""
+    id: int
+    name: str
+
+
+class ServiceRow:
+    """Lightweight row of service for listings, taken from elasticsearch '_source' instead of database"""
+    __slots__ = ("id", "title", "price", "type", "validity", "company")
+
+    def __init__(self, id: int, title: str, price: float, type: Related, validity: Related, company: Related):
+        self.id = id
+        self.title = title
+        self.price = price
+        self.type = type
+        self.validity = validity
+        self.company = company
+
+    @classmethod
+    def from_source(cls, id: int, source: Dict[str, Any]) -> Optional["ServiceRow"]:
+        """Build row from '_source' of hit. Return None if document misses any of 'LISTING_FIELDS'."""
+        try:
+            return cls(
+                id=id,
+                title=source["title"],
+                price=source["price"],
+                type=Related(source["type"]["id"], source["type"]["name"]),
+                validity=Related(source["validity"]["id"], source["validity"]["name"]),
+                company=Related(source["company"]["id"], source["company"]["name"])
+            )
+        except (KeyError, TypeError):
+            return None
+
+
+def encode_cursor(position: int, sort: List[Any]) -> str:
+    """Service for encoding elasticsearch 'search_after' sort values of the hit before 'position'"""
+    return urlsafe_b64encode(json.dumps([position, sort]).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, List[Any]]]:
+    """Service for decoding cursor, made by 'encode_cursor'. Return None for missing or malformed cursor."""
+    try:
+        position, sort = json.loads(urlsafe_b64decode(cursor.encode()))
+        return int(position), list(sort)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class ServiceSearchResult:
+    """Result of services search, executed once per request. Memoizes elasticsearch hits, total and hydrated rows.
+
+    Acts as a sequence for the Django paginator, fetching from elasticsearch only the sliced page.
+    With 'listing' set, rows are built from '_source' and only incomplete documents are loaded from database.
+    With 'cache_key' set, elasticsearch response for the requested page is cached in redis.
+    Attribute 'calls' counts round trips made to each backend.
+    """
+
+    def __init__(self, search: Search, number: int, per_page: int, cursor: Optional[str] = None,
+                 listing: bool = False, cache_key: Optional[str] = None):
+        self.search = search
+        self.number = number
+        self.per_page = per_page
+        self.cursor = cursor
+        self.listing = listing
+        self.cache_key = cache_key
+        self.calls: Dict[str, int] = {"elasticsearch": 0, "database": 0, "cache": 0}
+
+        self._window: Optional[Tuple[int, int]] = None
+        self._response = None
+        self._services: Optional[List[Service]] = None
+
+    @property
+    def window(self) -> Tuple[int, int]:
+        """Window [start, stop) of the requested page"""
+        start = (self.number - 1) * self.per_page
+        return start, start + self.per_page
+
+    @property
+    def response(self):
+        """Elasticsearch response for the current window, which is the requested page unless sliced otherwise"""
+        if self._response is None:
+            self._execute(*self.window)
+
+        return self._response
+
+    @property
+    def hits(self) -> List[Any]:
+        """Elasticsearch hits of the current window"""
+        return list(self.response.hits)
+
+    @property
+    def total(self) -> int:
+        """Total number of found services"""
+        return self.response.hits.total.value
 
+    @property
+    def services(self) -> List[Union[Service, ServiceRow]]:
+        """Services of the current window in elasticsearch order, loaded from database by at most one query"""
+        if self._services is None:
+            rows: Dict[int, Union[Service, ServiceRow, None]] = dict()
+            for hit in self.hits:
+                pk = int(hit.meta.id)
+                rows[pk] = ServiceRow.from_source(pk, hit.to_dict()) if self.listing else None
 
-def search_by_services(request: HttpRequest) -> QuerySet:
-    """Service for receive all services by query and filter terms"""
+            missing = [pk for pk, row in rows.items() if row is None]
+            if missing:
+                queryset = Service.objects.select_related("type", "validity", "company")
+                rows.update(queryset.in_bulk(missing))
+                self.calls["database"] += 1
+
+            self._services = [row for row in rows.values() if row is not None]
+
+        return self._services
+
+    @property
+    def facets(self) -> Dict[str, List[Tuple[int, str, int]]]:
+        """Options of every facet as (id, name, count), counted under all filters except the facet's own"""
+        aggregations = self.response.to_dict().get("aggregations", {})
+
+        facets: Dict[str, List[Tuple[int, str, int]]] = {facet: list() for facet in FACETS}
+        for facet in FACETS:
+            for bucket in aggregations.get(facet, {}).get("options", {}).get("buckets", []):
+                if facet in FACET_REFERENCES:
+                    reference = FACET_REFERENCES[facet].objects.get(bucket["key"])
+                    name = reference.name if reference is not None else None
+                else:
+                    name = bucket["name"]["hits"]["hits"][0]["_source"][facet]["name"]
+
+                if name is not None:
+                    facets[facet].append((bucket["key"], name, bucket["doc_count"]))
+
+        return facets
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        """Cursor for fetching the page after the current one with 'search_after'"""
+        if len(self.hits) == 0:
+            return None
+
+        return encode_cursor(self._window[1], list(self.hits[-1].meta.sort))
+
+    def count(self) -> int:
+        """Return total number of found services, as expected by paginator"""
+        return self.total
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __getitem__(self, key: slice) -> List[Service]:
+        if self._window is None or key.start != self._window[0] or key.stop > self._window[1]:
+            self._execute(key.start, key.stop)
+
+        return self.services[0:key.stop - key.start]
+
+    def _execute(self, start: int, stop: int) -> None:
+        """Fetch services in [start, stop) window, from cache for the requested page or from elasticsearch"""
+        self._window = (start, stop)
+        self._services = None
+
+        if self.cache_key is None or self._window != self.window:
+            self._response = self._search(start, stop)
+            return
+
+        self.calls["cache"] += 1
+        payload = get_search_page(self.cache_key)
+        if "response" in payload:
+            self._response = SearchResponse(self.search, payload["response"])
+            return
+
+        self._response = self._search(start, stop)
+        set_search_page(self.cache_key, {"generation": payload["generation"], "response": self._response.to_dict()})
+        self.calls["cache"] += 1
+
+    def _search(self, start: int, stop: int) -> SearchResponse:
+        """Search services in [start, stop) window with 'from' and 'size', or with 'search_after' for deep pages"""
+        search = self.search.source(LISTING_FIELDS if self.listing else False).extra(track_total_hits=True)
+        if stop <= MAX_RESULT_WINDOW:
+            search = search[start:stop]
+        else:
+            after = self._search_after(start)
+            search = search[0:stop - start].extra(search_after=after) if after is not None else search[0:0]
+
+        self.calls["elasticsearch"] += 1
+        return search.execute()
+
+    def _search_after(self, start: int) -> Optional[List[Any]]:
+        """Return sort values of the hit before 'start', taken from cursor or by walking through the index.
+        Raise InvalidPage for positions deeper than 'MAX_WALK_DEPTH' without cursor."""
+        cursor = decode_cursor(self.cursor)
+        if cursor is not None and cursor[0] == start:
+            return cursor[1]
+
+        if start > MAX_WALK_DEPTH:
+            raise InvalidPage("Page is too deep to be reached without cursor of the previous page")
+
+        position, after = 0, None
+        while position < start:
+            step = min(start - position, MAX_RESULT_WINDOW)
+            # Walking requests need only sort values, so facet aggregations are dropped
+            search = self.search.source(False).extra(aggs={})[0:step]
+            hits = (search.extra(search_after=after) if after is not None else search).execute().hits
+            self.calls["elasticsearch"] += 1
+            if len(hits) < step:
+                return None
+
+            position, after = position + step, list(hits[-1].meta.sort)
+
+        return after
+
+
+def build_services_search(request: HttpRequest) -> Search:
+    """Service for building search of services by query and filter terms"""
     services = ServiceDocument.search()
 
     query: str = request.GET.get("query")
@@ -28,21 +306,329 @@ def search_by_services(request: HttpRequest) -> QuerySet:
             )
         )
 
-    filters: Dict[str, Optional[int]] = dict()
-    for field in ["type", "validity", "company"]:
+    # Ranges narrow both hits and facet counts
+    for name, field in RANGES.items():
+        bounds = get_range(request, name)
+        if bounds:
+            services = services.filter("range", **{field: bounds})
+
+    filters: Dict[str, Q] = dict()
+    for field in FACETS:
         parameter = request.GET.get(field)
         if parameter is not None:
-            filters.update({f"{field}.id": int(parameter)})
+            filters.update({field: Q("term", **{f"{field}.id": int(parameter)})})
 
-    for field, term in filters.items():
-        services = services.filter("term", **{field: term})
+    # Filters apply to hits only, so that each facet is counted under all filters except its own
+    for term in filters.values():
+        services = services.post_filter(term)
 
+    for facet in FACETS:
+        others = [term for field, term in filters.items() if field != facet]
+        options = services.aggs.bucket(facet, "filter", filter=Q("bool", filter=others)) \
+            .bucket("options", "terms", field=f"{facet}.id", size=FACET_SIZE)
+        if facet not in FACET_REFERENCES:
+            options.bucket("name", "top_hits", size=1, _source=[f"{facet}.name"])
+
+    # Sorting by 'id' as a tiebreaker makes the order total, which is required for 'search_after'
     sort: Optional[str] = request.GET.get("sort")
-    services = services.sort(sort) if sort is not None else services.sort()
+    return services.sort(SORTING[sort], "id") if sort in SORTING else services.sort("_score", "id")
+
+
+def get_range(request: HttpRequest, name: str) -> Dict[str, float]:
+    """Service for receive bounds of range filter 'name' as 'gte' and 'lte', skipping missing and malformed ones"""
+    bounds: Dict[str, float] = dict()
+    for suffix, bound in [("min", "gte"), ("max", "lte")]:
+        try:
+            value = float(request.GET.get(f"{name}_{suffix}", ""))
+        except ValueError:
+            continue
+
+        if isfinite(value):
+            bounds[bound] = value
+
+    return bounds
+
+
+def normalize_prefix(prefix: Optional[str]) -> str:
+    """Service for normalizing typed prefix of autocomplete, so that cached suggestions are shared"""
+    return " ".join((prefix or "").lower().split())[:SUGGEST_PREFIX_LENGTH]
+
+
+def build_suggest_search(prefix: str) -> Search:
+    """Service for building completion suggest request by prefix, which skips hits and their sources"""
+    return ServiceDocument.search().source(False).extra(size=0).suggest(
+        "services", prefix, completion={"field": "suggest", "size": SUGGEST_SIZE, "skip_duplicates": True}
+    )
+
+
+def read_suggestions(body: Dict[str, Any]) -> List[str]:
+    """Service for reading suggested texts from elasticsearch response body"""
+    suggestions = body.get("suggest", {}).get("services", [])
+    return [option["text"] for suggestion in suggestions for option in suggestion.get("options", [])]
+
+
+def suggest_services(prefix: Optional[str]) -> List[str]:
+    """Service for receive autocomplete suggestions by typed prefix, cached in redis by normalized prefix"""
+    prefix = normalize_prefix(prefix)
+    if not prefix:
+        return list()
+
+    suggestions = get_suggestions(prefix)
+    if suggestions is None:
+        suggestions = read_suggestions(build_suggest_search(prefix).execute().to_dict())
+        set_suggestions(prefix, suggestions)
+
+    return suggestions
+
+
+def build_similar_search(detail: Dict[str, Any]) -> Search:
+    """Service for building search of services like the one of cached fragment 'detail': alike by title,
+    description and risks or of the same type, with price and coverage within 'SIMILAR_RANGE' times of its own"""
+    like = MoreLikeThis(
+        like=[{"_index": ServiceDocument._index._name, "_id": detail["id"]}],
+        fields=["title", "description", "type.name", "type.risks"],
+        min_term_freq=1,
+        min_doc_freq=1
+    )
+    alike = [like]
+    if detail.get("type") is not None:
+        alike.append(Q("term", **{"type.id": {"value": detail["type"], "boost": 2}}))
+
+    ranges = [
+        Q("range", **{field: {"gte": detail[field] / SIMILAR_RANGE, "lte": detail[field] * SIMILAR_RANGE}})
+        for field in ["price", "coverage_amount"] if detail.get(field)
+    ]
+
+    query = Q("bool", should=alike, minimum_should_match=1, filter=ranges, must_not=[Q("ids", values=[detail["id"]])])
+    return ServiceDocument.search().query(query).source(["title", "price", "company.name"])[0:SIMILAR_SIZE]
+
+
+def read_similar(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Service for reading similar services from elasticsearch response body"""
+    return [
+        {
+            "id": int(hit["_id"]),
+            "title": hit["_source"]["title"],
+            "price": hit["_source"]["price"],
+            "company": hit["_source"]["company"]["name"]
+        }
+        for hit in body["hits"]["hits"]
+    ]
+
+
+def get_similar_services(detail: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Service for receive similar services of cached fragment 'detail'. Services, cached alongside the fragment,
+    are returned as is, missing ones are searched and cached until the service is reindexed.
+    Failed search returns no services, so that the page is still shown."""
+    if "similar" in detail:
+        return detail["similar"]
+
+    try:
+        similar = read_similar(build_similar_search(detail).execute().to_dict())
+    except ElasticsearchException:
+        logger.exception("Failed to search similar services of service %s", detail["id"])
+        return list()
+
+    set_similar_services(detail["id"], similar)
+    return similar
+
+
+def get_page_number(request: HttpRequest) -> int:
+    """Service for receive requested page number, falling back to the first page"""
+    page: str = request.GET.get("page", "")
+    return int(page) if page.isdigit() and int(page) > 0 else 1
+
+
+def get_search_cache_key(request: HttpRequest, per_page: int, listing: bool) -> str:
+    """Service for building cache key of search page from normalized query, filter, sort and page parameters"""
+    parameters: Dict[str, Any] = {
+        field: request.GET.get(field, "").strip() for field in ["type", "validity", "company", "sort", "after"]
+    }
+    parameters.update({
+        "ranges": {name: get_range(request, name) for name in RANGES},
+        "query": " ".join(request.GET.get("query", "").lower().split()),
+        "page": get_page_number(request),
+        "per_page": per_page,
+        "listing": listing
+    })
+
+    return "search/pages/" + sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+
+def search_by_services(request: HttpRequest, per_page: int, listing: bool = False) -> ServiceSearchResult:
+    """Service for receive requested page of services by query and filter terms"""
+    services = build_services_search(request)
+    return ServiceSearchResult(services, get_page_number(request), per_page, cursor=request.GET.get("after"),
+                               listing=listing, cache_key=get_search_cache_key(request, per_page, listing))
+
+
+class KeysetPage:
+    """Page of rows, fetched by keyset (seek) pagination instead of OFFSET.
+
+    Rows after or before the cursor are found by a row comparison on the ordering columns,
+    which is an index range condition, so every page costs the same regardless of its depth.
+    """
+
+    def __init__(self, queryset: QuerySet, fields: Tuple[str, str], per_page: int,
+                 after: Optional[str] = None, before: Optional[str] = None, ordering: Optional[str] = None):
+        self.queryset = queryset
+        self.fields = fields
+        self.per_page = per_page
+        self.ordering = ordering
+
+        self._count: Optional[int] = None
+        self.rows: List[Any] = list()
+        self.next_cursor: Optional[str] = None
+        self.previous_cursor: Optional[str] = None
+
+        model = queryset.model
+        self._fetch(parse_row_cursor(after, model, fields), parse_row_cursor(before, model, fields))
+
+    @property
+    def count(self) -> int:
+        """Number of rows. Estimated by the query planner above 'PAGE_COUNT_EXACT' rows."""
+        if self._count is None:
+            self._count = count_rows(self.queryset)
+
+        return self._count
+
+    def _fetch(self, after: Optional[List[Any]], before: Optional[List[Any]]) -> None:
+        """Fetch one row more than the page, to know whether there is a page further in the direction of travel"""
+        backward = after is None and before is not None
+        ordering = [field[1:] if field.startswith("-") else f"-{field}" for field in self.fields] \
+            if backward else list(self.fields)
+
+        queryset = self.queryset.order_by(*ordering)
+        if after is not None or before is not None:
+            queryset = seek_rows(queryset, self.fields, after if after is not None else before, backward)
+
+        rows = list(queryset[:self.per_page + 1])
+        more, rows = len(rows) > self.per_page, rows[:self.per_page]
+        if backward:
+            rows.reverse()
+
+        self.rows = rows
+        if rows and (more or backward):
+            self.next_cursor = encode_row_cursor(rows[-1], self.fields)
+        if rows and (more or not backward) and (after is not None or before is not None):
+            self.previous_cursor = encode_row_cursor(rows[0], self.fields)
+
+
+def seek_rows(queryset: QuerySet, fields: Tuple[str, str], values: List[Any], backward: bool = False) -> QuerySet:
+    """Service for filtering rows past 'values' of ordering 'fields' with row comparison '(a, b) > (x, y)'"""
+    descending = fields[0].startswith("-")
+    operator = "<" if descending != backward else ">"
+
+    meta = queryset.model._meta
+    table = connection.ops.quote_name(meta.db_table)
+    columns, params = [], []
+    for field, value in zip(fields, values):
+        field = meta.get_field(field.lstrip("-"))
+        columns.append(f"{table}.{connection.ops.quote_name(field.column)}")
+        params.append(value)
+
+    # Django has no lookup for row comparison, which keeps both columns in the index condition
+    return queryset.extra(where=[f"({', '.join(columns)}) {operator} ({', '.join(['%s'] * len(params))})"],
+                          params=params)
+
+
+def encode_row_cursor(row: Any, fields: Tuple[str, str]) -> str:
+    """Service for encoding ordering values of row as cursor of keyset page"""
+    return encode_values([getattr(row, field.lstrip("-")) for field in fields])
+
+
+def encode_values(values: List[Any]) -> str:
+    """Service for encoding values of ordering columns as URL-safe cursor"""
+    return urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_row_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """Service for decoding cursor, made by 'encode_row_cursor'. Return None for missing or malformed cursor."""
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+        return values if isinstance(values, list) and len(values) == 2 else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def parse_row_cursor(cursor: Optional[str], model: Type[Model], fields: Tuple[str, str]) -> Optional[List[Any]]:
+    """Service for decoding cursor into values of ordering 'fields' of 'model'.
+    Return None for missing or malformed cursor, and for values, which do not fit the fields."""
+    values = decode_row_cursor(cursor)
+    if values is None:
+        return None
+
+    meta = model._meta
+    try:
+        values = [meta.get_field(field.lstrip("-")).to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, TypeError, ValueError):
+        return None
+
+    # Row comparison with NULL matches no rows
+    return None if None in values else values
+
+
+def count_rows(queryset: QuerySet) -> int:
+    """Service for counting rows from planner estimate, which does not scan the table.
+    Small results, where the estimate is the least accurate, are counted exactly."""
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+    if estimate <= settings.PAGE_COUNT_EXACT:
+        return queryset.count()
+
+    return estimate
+
+
+def parse_date(value: str) -> Optional[date]:
+    """Service for parsing ISO date of filter parameter. Return None for missing or malformed date."""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def filter_company_responses(request: HttpRequest) -> QuerySet:
+    """Service for receive responses to the company of user, filtered by service and date range"""
+    responses = Response.objects.filter(company=request.user)
+
+    service: str = request.GET.get("service", "")
+    if service.isdigit():
+        responses = responses.filter(service_id=int(service))
+
+    since, until = parse_date(request.GET.get("since", "")), parse_date(request.GET.get("until", ""))
+    if since is not None:
+        responses = responses.filter(response_date__gte=since)
+    if until is not None:
+        responses = responses.filter(response_date__lte=until)
+
+    return responses
+
+
+def get_response_ordering(request: HttpRequest) -> str:
+    """Service for receive requested ordering of responses, falling back to ordering by name"""
+    ordering = request.GET.get("sort", "full_name")
+    return ordering if ordering in RESPONSE_ORDERINGS else "full_name"
+
+
+def get_company_responses(request: HttpRequest) -> QuerySet:
+    """Service for receive responses to the company of user with their services, filtered by service and date range"""
+    return filter_company_responses(request).select_related("service")
+
+
+def get_company_services(request: HttpRequest) -> QuerySet:
+    """Service for receive all services of the company of user with the fields of services list"""
+    return Service.objects.filter(company=request.user).select_related("type", "company").defer("description")
+
 
-    return services[0:services.count()].to_queryset()
+def get_keyset_page(request: HttpRequest, queryset: QuerySet, fields: Tuple[str, str], per_page: int,
+                    ordering: Optional[str] = None) -> KeysetPage:
+    """Service for receive page of 'queryset' by 'fields', requested by 'after' or 'before' cursor"""
+    return KeysetPage(queryset, fields, per_page, after=request.GET.get("after"), before=request.GET.get("before"),
+                      ordering=ordering)
 
 
-def get_services_by_company(company_id: int) -> QuerySet:
-    """Service for receive all services by 'company_id'"""
-    return ServiceDocument.search().filter("term", **{"company.id": company_id}).to_queryset()
+def count_service_responses(service_ids: List[int]) -> Dict[int, int]:
+    """Service for counting responses to many services by one aggregate query"""
+    counts = Response.objects.filter(service_id__in=service_ids).values("service_id").annotate(count=Count("id"))
+    return {row["service_id"]: row["count"] for row in counts}
@@ -0,0 +1,75 @@
+import logging
+
+from typing import Any, Dict, Optional
+from redis.exceptions import RedisError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+from .cache import redis
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(DBStore):
+    """Session engine, that reads sessions from redis. Sessions are written through to database,
+    which serves reads of sessions missing from redis and all of them while redis is unavailable."""
+
+    @staticmethod
+    def key(session_key: str) -> str:
+        """Return redis key of session"""
+        return f"sessions/{session_key}"
+
+    def load(self) -> Dict[str, Any]:
+        data: Optional[bytes] = None
+        if self.session_key is not None:
+            try:
+                data = redis.get(self.key(self.session_key))
+            except RedisError:
+                logger.warning("Session is read from database, because redis is unavailable", exc_info=True)
+
+        if data is not None:
+            return self.decode(data.decode())
+
+        session = self._get_session_from_db()
+        if not session:
+            return dict()
+
+        self._cache(session.session_data, self.get_expiry_age(expiry=session.expire_date))
+        return self.decode(session.session_data)
+
+    def exists(self, session_key: str) -> bool:
+        try:
+            if session_key and redis.exists(self.key(session_key)):
+                return True
+        except RedisError:
+            pass
+
+        return super().exists(session_key)
+
+    def save(self, must_create: bool = False) -> None:
+        super().save(must_create)
+        self._cache(self.encode(self._get_session(no_load=must_create)), self.get_expiry_age())
+
+    def delete(self, session_key: Optional[str] = None) -> None:
+        super().delete(session_key)
+
+        session_key = session_key if session_key is not None else self.session_key
+        if session_key is not None:
+            try:
+                redis.delete(self.key(session_key))
+            except RedisError:
+                logger.warning("Session %s stays in redis until it expires", session_key, exc_info=True)
+
+    def flush(self) -> None:
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+
+    def _cache(self, session_data: str, expiry_age: int) -> None:
+        """Write encoded session into redis, expiring together with session"""
+        if expiry_age <= 0:
+            return
+
+        try:
+            redis.set(self.key(self.session_key), session_data, ex=expiry_age)
+        except RedisError:
+            logger.warning("Session is not cached, because redis is unavailable", exc_info=True)
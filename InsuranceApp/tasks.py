@@ -1,12 +1,17 @@
 import os
-import requests
 
+from typing import Optional
+from socket import gethostname
 from redis import StrictRedis
 from django.conf import settings
+from requests import RequestException
 from celery.signals import celeryd_after_setup
-from django.template.loader import get_template
 from InsuranceExchange.celery import celery_app
 
+from . import analytics, ingestion, notifications
+from . import metrics  # noqa: F401, connects task timing to Celery signals
+from .indexing import flush_queue
+
 
 @celeryd_after_setup.connect
 def configure_redis(*args, **kwargs) -> None:
@@ -17,16 +22,42 @@ def configure_redis(*args, **kwargs) -> None:
 
 @celery_app.task
 def send_response_notification(response: dict) -> None:
-    """Task method for Celery application, that send response notification from client to 'company'"""
-    body_template = get_template("mail.html")
-    params = {
-        "format": "json",
-        "api_key": os.getenv("UNISENDER_KEY", "api_key"),
-        "email": response["company"],
-        "sender_name": os.getenv("COMPANY_NAME", "name"),
-        "sender_email": os.getenv("COMPANY_EMAIL", "email"),
-        "subject": f"You have new response for «{response['service']}»",
-        "body": body_template.render(response),
-        "list_id": 1
-    }
-    requests.post("https://api.unisender.com/ru/api/sendEmail", params=params)
+    """Task method for Celery application, that queues response notification from client to 'company'.
+    Notifications to the same company within 'NOTIFICATION_WINDOW' seconds are delivered in one mail."""
+    if notifications.push(response):
+        deliver_notifications.apply_async(args=[response["company"]], countdown=settings.NOTIFICATION_WINDOW)
+
+
+@celery_app.task(bind=True, max_retries=settings.NOTIFICATION_RETRIES)
+def deliver_notifications(self, company: str, pending: Optional[list] = None) -> None:
+    """Task method for Celery application, that sends pending notifications to 'company', retrying with backoff"""
+    pending = pending if pending is not None else notifications.pop(company)
+    if not pending:
+        return
+
+    try:
+        notifications.send(company, pending)
+    except RequestException as exc:
+        countdown = settings.NOTIFICATION_RETRY_DELAY * 2 ** self.request.retries
+        raise self.retry(exc=exc, args=[company, pending], countdown=countdown)
+
+
+@celery_app.task
+def flush_search_index() -> None:
+    """Task method for Celery application, that flushes queued instances into elasticsearch index in bulk"""
+    flush_queue()
+
+
+@celery_app.task
+def ingest_responses() -> None:
+    """Task method for Celery application, that writes streamed responses into database in batches
+    and notifies companies about saved ones"""
+    ingestion.consume(f"{gethostname()}-{os.getpid()}",
+                      lambda record: send_response_notification(ingestion.notification(record)))
+
+
+@celery_app.task
+def rollup_analytics() -> None:
+    """Task method for Celery application, that aggregates new responses and views into daily stats of services"""
+    analytics.rollup_responses()
+    analytics.rollup_views()
@@ -0,0 +1,263 @@
+import os
+import time
+import uuid
+import threading
+
+from datetime import date
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests import RequestException
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response as SearchResponse
+
+from django.core.paginator import Paginator
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import ingestion
+from .cache import redis
+from .models import Company, InsuranceType, ValidityType, Service, Response
+from .notifications import get_session
+from .services import MAX_RESULT_WINDOW, RESPONSE_ORDERINGS, ServiceSearchResult, KeysetPage, \
+    build_services_search, encode_cursor, encode_values, parse_row_cursor, seek_rows
+
+
+def create_service(title: str = "Service") -> Service:
+    """Create service of a new company with its references"""
+    company = Company.objects.create(email=f"{uuid.uuid4().hex}@example.com", name="Company", phone="1")
+    return Service.objects.create(
+        title=title, type=InsuranceType.objects.create(name="Type", risks=["risk"]),
+        validity=ValidityType.objects.create(name="Year", time=1), coverage_amount=1000, price=10, company=company
+    )
+
+
+def fake_search(total: int):
+    """Return replacement of 'Search.execute', which answers with 'total' hits and records requested windows"""
+    requests = list()
+
+    def execute(search: Search) -> SearchResponse:
+        body = search.to_dict()
+        requests.append(body)
+        start = body["search_after"][0] + 1 if "search_after" in body else body.get("from", 0)
+        size = min(body.get("size", 10), max(total - start, 0))
+        hits = [
+            {
+                "_id": str(position + 1),
+                "sort": [position],
+                "_source": {
+                    "title": f"Service {position + 1}", "price": 10.0, "type": {"id": 1, "name": "Type"},
+                    "validity": {"id": 1, "name": "Year"}, "company": {"id": 1, "name": "Company"}
+                }
+            }
+            for position in range(start, start + size)
+        ]
+        return SearchResponse(search, {"hits": {"total": {"value": total, "relation": "eq"}, "hits": hits}})
+
+    return mock.patch.object(Search, "execute", autospec=True, side_effect=execute), requests
+
+
+class StubMailHandler(BaseHTTPRequestHandler):
+    """Mail provider stub, which answers POST requests with the next of 'server.replies'.
+    Reply "timeout" answers later than the read timeout of the client."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests += 1
+        reply = self.server.replies.pop(0) if self.server.replies else 200
+        if reply == "timeout":
+            time.sleep(0.5)
+            reply = 200
+
+        self.send_response(reply)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(NOTIFICATION_RETRIES=3, NOTIFICATION_BACKOFF=0)
+class NotificationSessionTests(SimpleTestCase):
+    """Retries of notification session against a stub mail provider"""
+
+    def setUp(self):
+        get_session.cache_clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubMailHandler)
+        self.server.requests, self.server.replies = 0, list()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        get_session.cache_clear()
+
+    def test_unavailable_provider_is_retried(self):
+        self.server.replies = [503, 429]
+        response = get_session(os.getpid()).post(self.url, data={"email": "company"}, timeout=(1, 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests, 3)
+
+    def test_server_error_is_not_retried(self):
+        self.server.replies = [500]
+        response = get_session(os.getpid()).post(self.url, data={"email": "company"}, timeout=(1, 1))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_read_timeout_is_not_retried(self):
+        self.server.replies = ["timeout"]
+        with self.assertRaises(RequestException):
+            get_session(os.getpid()).post(self.url, data={"email": "company"}, timeout=(1, 0.1))
+        self.assertEqual(self.server.requests, 1)
+
+
+class ServiceSearchResultTests(SimpleTestCase):
+    """Backend round trips of services search pages"""
+
+    def search(self, page: int, cursor=None) -> ServiceSearchResult:
+        request = RequestFactory().get("/", {"page": page})
+        return ServiceSearchResult(build_services_search(request), page, 10, cursor=cursor, listing=True)
+
+    def test_page_is_fetched_by_one_search(self):
+        patch, requests = fake_search(35)
+        with patch:
+            result = self.search(2)
+            page = Paginator(result, 10).page(2)
+            titles = [service.title for service in page.object_list]
+            self.assertEqual(result.total, 35)
+            self.assertIsNotNone(result.next_cursor)
+            self.assertEqual(result.facets["type"], [])
+
+        self.assertEqual(titles, [f"Service {position}" for position in range(11, 21)])
+        self.assertEqual(result.calls, {"elasticsearch": 1, "database": 0, "cache": 0})
+        self.assertEqual((requests[0]["from"], requests[0]["size"]), (10, 10))
+
+    def test_deep_page_with_cursor_is_fetched_by_one_search(self):
+        patch, requests = fake_search(MAX_RESULT_WINDOW * 2)
+        start = MAX_RESULT_WINDOW + 10
+        with patch:
+            result = self.search(start // 10 + 1, cursor=encode_cursor(start, [start - 1]))
+            page = Paginator(result, 10).page(start // 10 + 1)
+            self.assertEqual(page.object_list[0].title, f"Service {start + 1}")
+
+        self.assertEqual(result.calls["elasticsearch"], 1)
+        self.assertEqual(requests[0]["search_after"], [start - 1])
+
+
+class RowCursorTests(SimpleTestCase):
+    """Decoding of keyset cursors"""
+
+    fields = RESPONSE_ORDERINGS["-response_date"]
+
+    def test_cursor_is_converted_to_field_types(self):
+        cursor = encode_values([date(2021, 7, 1), 15])
+        self.assertEqual(parse_row_cursor(cursor, Response, self.fields), [date(2021, 7, 1), 15])
+
+    def test_invalid_cursor_is_missing(self):
+        for cursor in [None, "", "not base64!", encode_values([1]), encode_values(["July", 15]),
+                       encode_values(["2021-07-01", {}]), encode_values([None, 15])]:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(parse_row_cursor(cursor, Response, self.fields))
+
+    def test_seek_follows_ordering_direction(self):
+        queryset = Response.objects.all()
+        values = [date(2021, 7, 1), 15]
+        self.assertIn(") < (", str(seek_rows(queryset, self.fields, values).query))
+        self.assertIn(") > (", str(seek_rows(queryset, self.fields, values, backward=True).query))
+        self.assertIn(") > (", str(seek_rows(queryset, ("full_name", "id"), ["A", 1]).query))
+
+
+class KeysetPageTests(TestCase):
+    """Keyset pages of responses, walked forward and backward by cursors"""
+
+    def setUp(self):
+        self.service = create_service()
+        Response.objects.bulk_create([
+            Response(full_name=name, email="client@example.com", phone="1", birth_date=date(1990, 1, 1),
+                     service=self.service, company=self.service.company)
+            for name in ["E", "A", "D", "B", "C"]
+        ])
+        self.responses = Response.objects.filter(company=self.service.company)
+
+    def names(self, page: KeysetPage):
+        return [response.full_name for response in page.rows]
+
+    def test_pages_are_walked_by_cursors(self):
+        first = KeysetPage(self.responses, RESPONSE_ORDERINGS["full_name"], 2)
+        second = KeysetPage(self.responses, RESPONSE_ORDERINGS["full_name"], 2, after=first.next_cursor)
+        last = KeysetPage(self.responses, RESPONSE_ORDERINGS["full_name"], 2, after=second.next_cursor)
+        back = KeysetPage(self.responses, RESPONSE_ORDERINGS["full_name"], 2, before=last.previous_cursor)
+
+        self.assertEqual((self.names(first), self.names(second), self.names(last)), (["A", "B"], ["C", "D"], ["E"]))
+        self.assertIsNone(first.previous_cursor)
+        self.assertIsNone(last.next_cursor)
+        self.assertEqual(self.names(back), ["C", "D"])
+
+    def test_invalid_cursor_shows_first_page(self):
+        page = KeysetPage(self.responses, RESPONSE_ORDERINGS["-response_date"], 2, after=encode_values(["July", 1]))
+        self.assertEqual(len(page.rows), 2)
+        self.assertIsNone(page.previous_cursor)
+
+
+class IngestionTests(TestCase):
+    """Writing of streamed responses, deduplicated by idempotency key and acknowledged after commit"""
+
+    def setUp(self):
+        self.service = create_service()
+        self.stream = f"test/{uuid.uuid4().hex}/stream"
+        patcher = mock.patch.object(ingestion, "RESPONSE_STREAM_KEY", self.stream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.keys = list()
+
+    def tearDown(self):
+        redis.delete(self.stream, *[ingestion.notified_key(key) for key in self.keys])
+
+    def submit(self, key: uuid.UUID) -> None:
+        self.keys.append(key.hex)
+        cleaned_data = {"key": key, "full_name": "Client", "email": "client@example.com", "phone": "1",
+                        "birth_date": date(1990, 1, 1)}
+        ingestion.submit(cleaned_data, self.service)
+
+    def consume(self):
+        notified = list()
+        created = ingestion.consume("test", notified.append)
+        return created, notified
+
+    def test_resubmitted_response_is_written_and_notified_once(self):
+        key = uuid.uuid4()
+        self.submit(key)
+        self.submit(key)
+
+        created, notified = self.consume()
+        self.assertEqual(created, 1)
+        self.assertEqual(Response.objects.filter(key=key).count(), 1)
+        self.assertEqual([record["key"] for record in notified], [key.hex])
+
+    def test_entries_are_acknowledged(self):
+        self.submit(uuid.uuid4())
+        self.submit(uuid.uuid4())
+
+        self.consume()
+        self.assertEqual(redis.xlen(self.stream), 0)
+        self.assertEqual(redis.xpending(self.stream, ingestion.RESPONSE_GROUP)["pending"], 0)
+        self.assertEqual(self.consume(), (0, []))
+
+    def test_redelivered_response_is_notified_once(self):
+        # Response was committed by a consumer, which crashed before notifying and acknowledging it
+        key = uuid.uuid4()
+        Response.objects.create(key=key, full_name="Client", email="client@example.com", phone="1",
+                                birth_date=date(1990, 1, 1), service=self.service, company=self.service.company)
+        self.submit(key)
+
+        created, notified = self.consume()
+        self.assertEqual((created, len(notified)), (0, 1))
+
+        self.submit(key)
+        self.assertEqual(self.consume(), (0, []))
+
+    def test_response_to_deleted_service_is_dropped(self):
+        self.submit(uuid.uuid4())
+        Service.objects.filter(pk=self.service.pk).delete()
+
+        self.assertEqual(self.consume(), (0, []))
+        self.assertEqual(redis.xlen(self.stream), 0)
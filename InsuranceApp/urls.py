@@ -1,19 +1,30 @@
 from . import views
 
+from django.conf import settings
 from django.urls import path
 
 app_name = "InsuranceApp"
 
+# Async versions of the busiest views are served under ASGI
+ServiceListView = views.AsyncServiceListView if settings.ASYNC_VIEWS else views.ServiceListView
+ServiceView = views.AsyncServiceView if settings.ASYNC_VIEWS else views.ServiceView
+SuggestView = views.AsyncSuggestView if settings.ASYNC_VIEWS else views.SuggestView
+
 urlpatterns = [
-    path("", views.ServiceListView.as_view(), name="index"),
+    path("", ServiceListView.as_view(), name="index"),
+    path("suggest", SuggestView.as_view(), name="suggest"),
     path("login", views.LoginView.as_view(), name="login"),
     path("register", views.RegisterView.as_view(), name="register"),
     path("logout", views.LogoutView.as_view(), name="logout"),
     path("profile", views.UpdateUserView.as_view(), name="profile"),
     path("services", views.CompanyServicesView.as_view(), name="services"),
     path("create_service", views.CreateServiceView.as_view(), name="create_service"),
+    path("import_services", views.ImportServicesView.as_view(), name="import_services"),
     path("update_service/<int:service_id>", views.UpdateServiceView.as_view(), name="update_service"),
     path("delete_service/<int:service_id>", views.DeleteServiceView.as_view(), name="delete_service"),
-    path("services/<int:service_id>", views.ServiceView.as_view(), name="service"),
-    path("responses", views.ResponsesView.as_view(), name="responses")
+    path("services/<int:service_id>", ServiceView.as_view(), name="service"),
+    path("services/<int:service_id>/view", views.ServiceViewBeacon.as_view(), name="service_view"),
+    path("responses", views.ResponsesView.as_view(), name="responses"),
+    path("responses/export", views.ExportResponsesView.as_view(), name="export_responses"),
+    path("analytics", views.AnalyticsView.as_view(), name="analytics")
 ]
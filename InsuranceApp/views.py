@@ -1,24 +1,78 @@
+import asyncio
+
+from hmac import compare_digest
+
+from . import ingestion
+from .analytics import PERIODS, get_company_analytics, start_views
+from .asynchronous import search_services, get_service_page as aget_service_page, get_views, \
+    suggest_services as asuggest_services, get_similar_services as aget_similar_services
+from .cache import redis, bump_search_generation, get_service_page, set_service_page, bump_service_pages, \
+    service_page_key
+from .export import EXPORT_FORMATS, export_responses, parse_export_cursor
+from .imports import get_import_format, read_rows, import_services
+from .metrics import render_metrics
+from .counters import view_counter
 from .tasks import send_response_notification
-from .services import search_by_services, get_services_by_company
+from .services import MAX_WALK_DEPTH, RESPONSE_ORDERINGS, SERVICE_ORDERING, search_by_services, suggest_services, \
+    get_similar_services, get_company_services, get_company_responses, get_response_ordering, get_keyset_page, \
+    count_service_responses
 from .forms import RegisterForm, UpdateUserForm, ServiceForm, ResponseForm
-from .models import Company, Service, Response, InsuranceType, ValidityType
-
-from redis import StrictRedis
+from .models import Company, Service, Response
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.contrib import messages
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, \
+    StreamingHttpResponse
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
 
-from django.views.generic import View
+from django.views.generic import View, TemplateView
 from django.views.generic import DetailView
 from django.views.generic.list import ListView
 from django.views.generic.edit import FormView, CreateView, UpdateView, DeleteView
 
-redis = StrictRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0)
+
+class AsyncViewMixin:
+    """Mixin, that serves class-based view as a coroutine, because Django 3.2 supports only async function views.
+    Async handlers are awaited in the event loop, synchronous ones are run in a thread."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, self.http_method_not_allowed) \
+            if method in self.http_method_names else self.http_method_not_allowed
+
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(request, *args, **kwargs)
+
+        return await sync_to_async(handler)(request, *args, **kwargs)
+
+
+class KeysetPaginationMixin:
+    """Mixin, that paginates 'ListView' by keyset cursors instead of page numbers. Page object is 'KeysetPage'
+    of 'paginate_by' rows, ordered by fields of 'get_keyset_fields'."""
+
+    def get_keyset_fields(self):
+        raise NotImplementedError
+
+    def paginate_queryset(self, queryset, page_size):
+        page = get_keyset_page(self.request, queryset, self.get_keyset_fields(), page_size, self.get_ordering())
+        return None, page, page.rows, page.previous_cursor is not None or page.next_cursor is not None
 
 
 class ServiceListView(ListView):
@@ -28,27 +82,67 @@ class ServiceListView(ListView):
     template_name = "index.html"
 
     def get_queryset(self):
-        return search_by_services(self.request)
+        return search_by_services(self.request, per_page=self.paginate_by, listing=True)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
 
+        # 'self.object_list' is the search result, already executed while paginating
+        facets = self.object_list.facets
         context.update({
-            "found": self.get_queryset().count(),
+            "result": self.object_list,
             "sorting": (
                 ("title", "Title: A to Z"),
                 ("-title", "Title: Z to A"),
                 ("price", "Price: Low to High"),
-                ("-price", "Price: High to Low")
+                ("-price", "Price: High to Low"),
+                ("-coverage_amount", "Coverage: High to Low"),
+                ("-value", "Best value")
             ),
-            "companies": Company.objects.values_list("pk", "name"),
-            "types": InsuranceType.objects.values_list("pk", "name"),
-            "validities": ValidityType.objects.values_list("pk", "name")
+            "companies": facets["company"],
+            "types": facets["type"],
+            "validities": facets["validity"],
+            "max_page": MAX_WALK_DEPTH // self.paginate_by + 1
         })
 
         return context
 
 
+class AsyncServiceListView(AsyncViewMixin, ServiceListView):
+    """Async version of 'ServiceListView', that waits on redis and elasticsearch without blocking the worker"""
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object_list = await search_services(request, self.paginate_by)
+        except InvalidPage as error:
+            raise Http404(str(error))
+
+        # Paginating and facets may load incomplete rows and reference tables from database
+        context = await sync_to_async(self.get_context_data)()
+        return self.render_to_response(context)
+
+
+class SuggestView(View):
+    """Return autocomplete suggestions of search query by typed 'prefix' as JSON"""
+
+    def get(self, request, *args, **kwargs):
+        return self.render_suggestions(suggest_services(request.GET.get("prefix")))
+
+    @staticmethod
+    def render_suggestions(suggestions):
+        """Return suggestions response, which browsers may reuse while suggestions are cached"""
+        response = JsonResponse({"suggestions": suggestions})
+        response["Cache-Control"] = f"public, max-age={settings.SUGGEST_CACHE_TIMEOUT}"
+        return response
+
+
+class AsyncSuggestView(AsyncViewMixin, SuggestView):
+    """Async version of 'SuggestView'"""
+
+    async def get(self, request, *args, **kwargs):
+        return self.render_suggestions(await asuggest_services(request.GET.get("prefix")))
+
+
 class RegisterView(SuccessMessageMixin, CreateView):
     """View for creating a new 'Company' object, with a response rendered by a template"""
     form_class = RegisterForm
@@ -95,16 +189,36 @@ class UpdateUserView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     def get_object(self, queryset=None):
         return self.request.user
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
 
-class CompanyServicesView(LoginRequiredMixin, ListView):
-    """Render 'Service' list of objects, set by 'get_queryset' function"""
-    paginate_by = 10
-    ordering = "title"
+        # Company name is a part of cached fragments of its services
+        bump_service_pages(Service.objects.filter(company=self.object).values_list("pk", flat=True))
+        return response
+
+
+class CompanyServicesView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """Render all services of the company, paginated by title with keyset cursors"""
+    paginate_by = 25
     login_url = "/login"
     template_name = "services/services.html"
 
     def get_queryset(self):
-        return get_services_by_company(self.request.user.id)
+        return get_company_services(self.request)
+
+    def get_keyset_fields(self):
+        return SERVICE_ORDERING
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(**kwargs)
+        services = context["object_list"]
+
+        # Views of all services on the page are read by one MGET, their responses are counted by one query
+        ids = [service.id for service in services]
+        views, responses = view_counter.get_many(ids), count_service_responses(ids)
+        context["rows"] = [(service, views[service.id], responses.get(service.id, 0)) for service in services]
+
+        return context
 
 
 class CreateServiceView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -120,10 +234,30 @@ class CreateServiceView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
         service.company = self.request.user
         service.save()
 
-        redis.set(f"services/{service.id}", 0)
+        pipeline = redis.pipeline(transaction=False)
+        start_views(pipeline, [service.id])
+        pipeline.execute()
+        bump_search_generation()
         return super().form_valid(form)
 
 
+class ImportServicesView(LoginRequiredMixin, View):
+    """Import 'Service' objects of the company from uploaded CSV, JSON or JSON Lines file, with a JSON report"""
+    login_url = "/login"
+
+    def post(self, request, *args, **kwargs):
+        file = request.FILES.get("file")
+        if file is None:
+            return JsonResponse({"error": "File is required"}, status=400)
+
+        report = import_services(request.user, read_rows(file, get_import_format(file.name)))
+        if report["error"] is not None and not report["created"] and not report["updated"]:
+            return JsonResponse(report, status=400)
+
+        # Rows before malformed part of the file are written, so the import is reported as partial
+        return JsonResponse(report, status=200 if not report["errors"] and report["error"] is None else 207)
+
+
 class UpdateServiceView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     """View for updating an 'Service' object, with a response rendered by a template"""
     model = Service
@@ -134,6 +268,13 @@ class UpdateServiceView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     template_name = "services/update.html"
     success_message = "Service successful updated"
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+
+        bump_service_pages([self.object.id])
+        bump_search_generation()
+        return response
+
 
 class DeleteServiceView(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
     """View for deleting an 'Service' object, with a response rendered by a template"""
@@ -146,11 +287,14 @@ class DeleteServiceView(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
     def get(self, request, *args, **kwargs):
         return self.post(request, *args, **kwargs)
 
-    def form_valid(self, form):
-        service: Service = form.save()
+    def delete(self, request, *args, **kwargs):
+        service_id = self.kwargs[self.pk_url_kwarg]
+        response = super().delete(request, *args, **kwargs)
 
-        redis.delete(f"services/{service.id}")
-        return super().form_valid(form)
+        redis.delete(view_counter.key(service_id), service_page_key(service_id))
+        bump_service_pages([service_id])
+        bump_search_generation()
+        return response
 
 
 class ServiceView(SuccessMessageMixin, DetailView, CreateView):
@@ -162,11 +306,63 @@ class ServiceView(SuccessMessageMixin, DetailView, CreateView):
     template_name = "service.html"
     context_object_name = "service"
 
+    def get_queryset(self):
+        return Service.objects.select_related("type", "validity", "company")
+
+    def get(self, request, *args, **kwargs):
+        # Service is rendered from cached fragment, so 'self.object' is left unset unless the fragment is missed
+        self.object = None
+        self.detail = self.get_detail()
+        self.similar = get_similar_services(self.detail)
+        return self.render_to_response(self.get_context_data())
+
+    def get_detail(self) -> dict:
+        """Return cached fragment of service with its id, title, company and search fields, rendering it on a miss"""
+        payload = get_service_page(self.kwargs[self.pk_url_kwarg])
+        return payload if "html" in payload else self.render_detail(payload)
+
+    def render_detail(self, payload: dict) -> dict:
+        """Render service fragment and cache it under the version of 'payload'. Raise Http404 for missing service."""
+        service: Service = self.get_object()
+        payload.update({
+            "id": service.id,
+            "title": service.title,
+            "company": service.company.id,
+            "type": service.type.id,
+            "price": service.price,
+            "coverage_amount": service.coverage_amount,
+            "html": render_to_string("services/detail.html", {"service": service})
+        })
+
+        set_service_page(service.id, payload)
+        return payload
+
+    def post(self, request, *args, **kwargs):
+        # Service is kept aside, because 'self.object' of the create view is the new 'Response'
+        self.service = self.get_object()
+        return super().post(request, *args, **kwargs)
+
     def form_valid(self, form):
+        if settings.RESPONSE_INGESTION == "stream":
+            ingestion.submit(form.cleaned_data, self.service)
+
+            messages.success(self.request, self.get_success_message(form.cleaned_data))
+            return HttpResponseRedirect(self.get_success_url())
+
         response: Response = form.save(commit=False)
-        response.service = Service.objects.get(pk=self.object.id)
-        response.company = response.service.company
-        response.save()
+        response.service = self.service
+        response.company = self.service.company
+        response.key = form.cleaned_data["key"]
+        try:
+            with transaction.atomic():
+                response.save()
+        except IntegrityError:
+            if not Response.objects.filter(key=response.key).exists():
+                raise
+
+            # Resubmitted form was already saved and notified about
+            messages.success(self.request, self.get_success_message(form.cleaned_data))
+            return HttpResponseRedirect(self.get_success_url())
 
         send_response_notification.delay({
             "email": response.email,
@@ -179,25 +375,137 @@ class ServiceView(SuccessMessageMixin, DetailView, CreateView):
 
         return super().form_valid(form)
 
+    def form_invalid(self, form):
+        self.object = None
+        self.detail = self.get_detail()
+        self.similar = get_similar_services(self.detail)
+        return super().form_invalid(form)
+
     def get_success_message(self, cleaned_data):
-        return f"Response to {self.object.company.name} successful created"
+        return f"Response to {self.service.company.name} successful created"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        redis.incr(f"services/{self.object.id}")
+        context["detail"] = self.detail
+        context["similar"] = self.similar
+
+        # Views are counted by 'ServiceViewBeacon', so that the page does not depend on them
+        if self.detail["company"] == self.request.user.id:
+            context["views"] = view_counter.get(self.detail["id"])
+
+        return context
+
 
-        if self.object.company.id == self.request.user.id:
-            context["views"] = int(redis.get(f"services/{self.object.id}"))
+@method_decorator(csrf_exempt, name="dispatch")
+class ServiceViewBeacon(View):
+    """Count view of 'Service', reported by the page after it is loaded"""
+
+    def post(self, request, *args, **kwargs):
+        service_id = kwargs["service_id"]
+
+        # Fragment is cached for every recently shown service, so database is asked only for unknown ids
+        if not redis.exists(service_page_key(service_id)) and not Service.objects.filter(pk=service_id).exists():
+            raise Http404("Service does not exist")
+
+        view_counter.incr(service_id)
+        return HttpResponse(status=204)
+
+
+class AsyncServiceView(AsyncViewMixin, ServiceView):
+    """Async version of 'ServiceView', that reads service fragment and its views from redis concurrently"""
+
+    async def get(self, request, *args, **kwargs):
+        service_id = kwargs[self.pk_url_kwarg]
+        payload, views, user_id = await asyncio.gather(
+            aget_service_page(service_id),
+            get_views(service_id),
+            sync_to_async(lambda: request.user.id)()
+        )
+
+        self.object = None
+        self.detail = payload if "html" in payload else await sync_to_async(self.render_detail)(payload)
+        self.similar = await aget_similar_services(self.detail)
+
+        context = self.get_context_data(views=views if self.detail["company"] == user_id else None)
+        return self.render_to_response(context)
+
+    def get_context_data(self, views=None, **kwargs):
+        # Views are already fetched by 'get', so 'ServiceView.get_context_data' is skipped
+        context = super(ServiceView, self).get_context_data(**kwargs)
+        context["detail"] = self.detail
+        context["similar"] = self.similar
+        if views is not None:
+            context["views"] = views
 
         return context
 
 
-class ResponsesView(LoginRequiredMixin, ListView):
+class ResponsesView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Render 'Response' list of objects, set by 'get_queryset' function"""
     paginate_by = 10
-    ordering = "full_name"
     login_url = "/login"
     template_name = "responses.html"
 
     def get_queryset(self):
-        return Response.objects.filter(company=self.request.user)
+        return get_company_responses(self.request)
+
+    def get_ordering(self):
+        return get_response_ordering(self.request)
+
+    def get_keyset_fields(self):
+        return RESPONSE_ORDERINGS[self.get_ordering()]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["sorting"] = [("full_name", "Name"), ("-response_date", "Newest")]
+        context["services"] = Service.objects.filter(company=self.request.user).only("id", "title").order_by("title")
+        return context
+
+
+class ExportResponsesView(LoginRequiredMixin, View):
+    """Stream 'Response' objects of the company as CSV or JSON Lines file, filtered like the responses list"""
+    login_url = "/login"
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            export_format = "csv"
+
+        # Cursor is checked before the headers are sent, so that a bad one does not truncate the file
+        cursor = request.GET.get("after")
+        after = parse_export_cursor(cursor)
+        if cursor and after is None:
+            return HttpResponseBadRequest("Malformed cursor")
+
+        response = StreamingHttpResponse(export_responses(request, export_format, after),
+                                         content_type=EXPORT_FORMATS[export_format])
+        response["Content-Disposition"] = f'attachment; filename="responses.{export_format}"'
+        return response
+
+
+class AnalyticsView(LoginRequiredMixin, TemplateView):
+    """Render views, responses and conversion of the company services, read from daily stats"""
+    login_url = "/login"
+    template_name = "analytics.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        days = self.request.GET.get("days")
+        days = int(days) if days in [str(period) for period in PERIODS] else PERIODS[1]
+
+        context["days"] = days
+        context["periods"] = PERIODS
+        context["analytics"] = get_company_analytics(self.request.user, days)
+        return context
+
+
+class MetricsView(View):
+    """Render request, backend and Celery task metrics in Prometheus text format, to scrapers with 'METRICS_TOKEN'"""
+
+    def get(self, request, *args, **kwargs):
+        if not compare_digest(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+            response = HttpResponse(status=401)
+            response["WWW-Authenticate"] = "Bearer"
+            return response
+
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
@@ -8,9 +8,57 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
 import os
+import asyncio
+import django
 
-from django.core.asgi import get_asgi_application
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.core.handlers.asgi import ASGIHandler
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "InsuranceExchange.settings")
 
-application = get_asgi_application()
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI handler, that pulls parts of streaming responses in a thread of their own. Django 3.2 iterates them
+    inside the event loop, where iterators that query database, like export of responses, are not allowed."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        headers = list()
+        for header, value in response.items():
+            header = header.encode("ascii") if isinstance(header, str) else header
+            value = value.encode("latin1") if isinstance(value, str) else value
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b"Set-Cookie", cookie.output(header="").encode("ascii").strip()))
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+
+        # One thread keeps the database connection and server-side cursor of the iterator for all of its parts
+        loop, executor = asyncio.get_running_loop(), ThreadPoolExecutor(max_workers=1)
+        parts, finished = iter(response), object()
+        try:
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, finished)
+                if part is finished:
+                    break
+
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+            await send({"type": "http.response.body"})
+        finally:
+            await loop.run_in_executor(executor, response.close)
+            await loop.run_in_executor(executor, connections.close_all)
+            executor.shutdown(wait=False)
+
+
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
+
+# Static files are served in development the same way, as by 'runserver'
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
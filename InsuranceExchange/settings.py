@@ -38,14 +38,16 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "InsuranceApp",
     "crispy_forms",
-    "django_elasticsearch_dsl"
+    "django_elasticsearch_dsl",
+    # After 'django_elasticsearch_dsl', which configures elasticsearch connection replaced by the instrumented one
+    "InsuranceApp"
 ]
 
 CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 MIDDLEWARE = [
+    "InsuranceApp.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -74,6 +76,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "InsuranceExchange.wsgi.application"
+ASGI_APPLICATION = "InsuranceExchange.asgi.application"
+
+# Search and service pages are served by async views with async redis and elasticsearch clients, under ASGI server
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -136,6 +142,14 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "InsuranceApp.Company"
 
+# Logged in company is cached in redis. 'ModelBackend' is not listed after it, so that failed logins
+# are not checked twice, which logs out sessions created by 'ModelBackend' once.
+AUTHENTICATION_BACKENDS = ["InsuranceApp.backends.CachedModelBackend"]
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", 300))
+
+# Sessions are read from redis and written through to database
+SESSION_ENGINE = "InsuranceApp.sessions"
+
 # Custom message tags for Bootstrap
 
 MESSAGE_TAGS = {
@@ -147,6 +161,17 @@ MESSAGE_TAGS = {
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_BROKER_TRANSPORT = os.getenv("CELERY_BROKER_TRANSPORT", "redis")
 
+CELERY_BEAT_SCHEDULE = {
+    "ingest-responses": {
+        "task": "InsuranceApp.tasks.ingest_responses",
+        "schedule": float(os.getenv("RESPONSE_INGESTION_INTERVAL", 1))
+    },
+    "rollup-analytics": {
+        "task": "InsuranceApp.tasks.rollup_analytics",
+        "schedule": float(os.getenv("ANALYTICS_ROLLUP_INTERVAL", 60))
+    }
+}
+
 # Elasticsearch configuration
 
 ELASTICSEARCH_DSL = {
@@ -155,7 +180,76 @@ ELASTICSEARCH_DSL = {
     }
 }
 
+# Saved instances are queued into redis and indexed in bulk by Celery
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = "InsuranceApp.indexing.QueuedSignalProcessor"
+
+SEARCH_INDEX_DELAY = int(os.getenv("SEARCH_INDEX_DELAY", 2))
+SEARCH_INDEX_BATCH = int(os.getenv("SEARCH_INDEX_BATCH", 500))
+SEARCH_INDEX_RETRY_DELAY = int(os.getenv("SEARCH_INDEX_RETRY_DELAY", 30))
+
 # Redis server configuration
 
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = os.getenv("REDIS_PORT", 6379)
+
+# Search results cache configuration
+
+SEARCH_CACHE_TIMEOUT = int(os.getenv("SEARCH_CACHE_TIMEOUT", 60))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 10000))
+SUGGEST_CACHE_TIMEOUT = int(os.getenv("SUGGEST_CACHE_TIMEOUT", 30))
+
+# Seconds between checks of reference tables version
+
+REFERENCE_CACHE_CHECK = int(os.getenv("REFERENCE_CACHE_CHECK", 5))
+
+# Service views counter buffering
+
+VIEW_COUNTER_INTERVAL = float(os.getenv("VIEW_COUNTER_INTERVAL", 1))
+VIEW_COUNTER_SIZE = int(os.getenv("VIEW_COUNTER_SIZE", 100))
+
+# Response notifications delivery
+
+NOTIFICATION_URL = os.getenv("UNISENDER_URL", "https://api.unisender.com/ru/api/sendEmail")
+NOTIFICATION_WINDOW = int(os.getenv("NOTIFICATION_WINDOW", 30))
+NOTIFICATION_TIMEOUT = (float(os.getenv("NOTIFICATION_CONNECT_TIMEOUT", 3)),
+                        float(os.getenv("NOTIFICATION_READ_TIMEOUT", 10)))
+NOTIFICATION_RETRIES = int(os.getenv("NOTIFICATION_RETRIES", 3))
+NOTIFICATION_BACKOFF = float(os.getenv("NOTIFICATION_BACKOFF", 0.5))
+NOTIFICATION_RETRY_DELAY = int(os.getenv("NOTIFICATION_RETRY_DELAY", 30))
+
+# Response ingestion: "stream" appends responses to redis stream, written into database by Celery, "direct" saves them
+
+RESPONSE_INGESTION = os.getenv("RESPONSE_INGESTION", "stream")
+RESPONSE_BATCH = int(os.getenv("RESPONSE_BATCH", 500))
+RESPONSE_CLAIM_IDLE = int(os.getenv("RESPONSE_CLAIM_IDLE", 60000))
+RESPONSE_MAX_BATCHES = int(os.getenv("RESPONSE_MAX_BATCHES", 20))
+
+# Keyset paginated pages: rows are counted exactly up to this number, above it planner estimate is shown
+
+PAGE_COUNT_EXACT = int(os.getenv("PAGE_COUNT_EXACT", 1000))
+RESPONSE_EXPORT_CHUNK = int(os.getenv("RESPONSE_EXPORT_CHUNK", 2000))
+
+# Services import: rows validated, written and indexed together
+
+SERVICE_IMPORT_BATCH = int(os.getenv("SERVICE_IMPORT_BATCH", 1000))
+
+# Instrumentation: requests slower than this number of seconds are logged with their longest backend calls
+
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", 0.5))
+
+# Metrics are served only when the token is set, to scrapers sending it as "Authorization: Bearer <token>"
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Rendered service fragments are cached until service or its company changes, but not longer than this timeout
+
+SERVICE_PAGE_TIMEOUT = int(os.getenv("SERVICE_PAGE_TIMEOUT", 600))
+
+# Similar services of service are cached until it is reindexed, but not longer than this timeout
+
+SIMILAR_CACHE_TIMEOUT = int(os.getenv("SIMILAR_CACHE_TIMEOUT", 3600))
+
+# Analytics: new responses and views are aggregated into daily stats of services in batches of this size
+
+ANALYTICS_ROLLUP_BATCH = int(os.getenv("ANALYTICS_ROLLUP_BATCH", 10000))
+ANALYTICS_ROLLUP_LAG = int(os.getenv("ANALYTICS_ROLLUP_LAG", 60))
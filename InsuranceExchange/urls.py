@@ -13,13 +13,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path, include
 from django.views.generic import RedirectView
 from django.contrib.staticfiles.storage import staticfiles_storage
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from InsuranceApp.views import MetricsView
 
 urlpatterns = [
     path("", include("InsuranceApp.urls")),
     path("favicon.ico", RedirectView.as_view(url=staticfiles_storage.url("favicon.ico")))
 ]
 urlpatterns += staticfiles_urlpatterns()
+
+# Metrics are kept out of the application routes and exist only when scrapers have a token
+if settings.METRICS_TOKEN:
+    urlpatterns.append(path("metrics", MetricsView.as_view(), name="metrics"))